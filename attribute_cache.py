@@ -0,0 +1,61 @@
+import threading
+import time
+
+ATTRIBUTE_FIELDS = ('make', 'model', 'year', 'vin')
+
+
+class AttributeCache:
+    """
+    Cross-run cache of the immutable vehicle attributes (make, model, year, VIN).
+
+    Entries live in the sync state store next to the rest of a vehicle's state.
+    They expire after max_age seconds, and disappear with the vehicle when
+    SyncStateStore.prune drops vehicles no longer listed by Smartcar. Hits and
+    misses are counted so each run or daemon cycle can report its hit ratio.
+    """
+
+    def __init__(self, state_store, max_age):
+        self.state_store = state_store
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, smartcar_id):
+        """
+        Returns the cached attributes for a vehicle, or None if missing or expired.
+        """
+        state = self.state_store.get(smartcar_id)
+        cached_at = state and state['attributes_cached_at']
+        if not cached_at or time.time() - cached_at > self.max_age:
+            self._count(False)
+            return None
+        self._count(True)
+        return {field: state[field] for field in ATTRIBUTE_FIELDS}
+
+    def put(self, smartcar_id, attributes):
+        self.state_store.update(
+            smartcar_id,
+            attributes_cached_at=time.time(),
+            **{field: attributes[field] for field in ATTRIBUTE_FIELDS}
+        )
+
+    def report(self):
+        """
+        One-line summary of the cache's effectiveness since the last report, which resets the counts.
+
+        Returns None when there were no lookups.
+        """
+        with self._lock:
+            hits, misses = self.hits, self.misses
+            self.hits = self.misses = 0
+        if not hits + misses:
+            return None
+        return f"Attribute cache: {hits} hits, {misses} misses ({hits / (hits + misses):.1%} hit ratio)."
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Measures smart_fetch sync throughput (vehicles/second) against the local
+stub server at increasing worker-pool sizes.
+
+Usage:
+    python benchmarks/bench_concurrency.py --vehicles 200 --latency 0.05
+"""
+
+import argparse
+import contextlib
+import io
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_server import configure_environment, start_stub_process, stub_control  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds added to every stub response")
+    parser.add_argument('--levels', default="1,2,4,8,16,32", help="comma-separated worker counts")
+    args = parser.parse_args()
+    # Only the results table is of interest; keep the sync's log output out of it
+    logging.disable(logging.CRITICAL)
+    levels = [int(level) for level in args.levels.split(',')]
+
+    process, base_url = start_stub_process(fleet_size=args.vehicles, latency=args.latency)
+    configure_environment(base_url)
+    # Per-API caps must not be the bottleneck being measured
+    os.environ['SMARTCAR_MAX_CONCURRENCY'] = str(max(levels))
+    os.environ['FLEETIO_MAX_CONCURRENCY'] = str(max(levels))
+
+    import smart_fetch
+
+    vehicle_ids = smart_fetch.get_vehicle_ids('stub-access-token')
+    baseline = None
+    print(f"{'workers':>8} {'seconds':>9} {'vehicles/s':>11} {'speedup':>8} {'end state':>10}")
+    for workers in levels:
+        stub_control(base_url, 'reset')
+        smart_fetch.reset_fleetio_index()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            smart_fetch.sync_vehicles_concurrently('stub-access-token', vehicle_ids, max_workers=workers)
+        elapsed = time.perf_counter() - start
+
+        end_state = stub_control(base_url, 'end_state')
+        end_state.pop('requests')
+        end_state.pop('rejected')
+        if baseline is None:
+            baseline = (elapsed, end_state)
+        same = "same" if end_state == baseline[1] else "DIFFERS"
+        print(f"{workers:>8} {elapsed:>9.2f} {len(vehicle_ids) / elapsed:>11.1f} "
+              f"{baseline[0] / elapsed:>7.1f}x {same:>10}")
+
+    process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Compares an unpaced sync against the token-bucket RequestScheduler when the
+local stub server enforces a per-API rate limit.
+
+Without pacing, workers burst past the limit and a 429 on a meter entry
+loses the reading. With the scheduler, requests are paced to the limit and
+429s are waited out and retried, so every reading lands.
+
+Usage:
+    python benchmarks/bench_rate_limit.py --vehicles 100 --limit 40 --workers 16
+"""
+
+import argparse
+import contextlib
+import io
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_server import configure_environment, start_stub_process, stub_control  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=100)
+    parser.add_argument('--limit', type=int, default=40, help="stub requests/second allowed per API")
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.02, help="seconds added to every stub response")
+    args = parser.parse_args()
+    # Only the results table is of interest; keep the sync's log output out of it
+    logging.disable(logging.CRITICAL)
+
+    process, base_url = start_stub_process(fleet_size=args.vehicles, latency=args.latency, rate_limit=args.limit)
+    configure_environment(base_url)
+    os.environ.update({
+        'SYNC_STATE_PATH': '',
+        'SMARTCAR_RATE_LIMIT': str(args.limit), 'SMARTCAR_RATE_BURST': str(args.limit),
+        'FLEETIO_RATE_LIMIT': str(args.limit), 'FLEETIO_RATE_BURST': str(args.limit),
+        'SMARTCAR_MAX_CONCURRENCY': str(args.workers), 'FLEETIO_MAX_CONCURRENCY': str(args.workers),
+    })
+
+    import smart_fetch
+
+    schedulers = (smart_fetch.smartcar_client.scheduler, smart_fetch.fleetio_client.scheduler)
+    vehicle_ids = smart_fetch.get_vehicle_ids('stub-access-token')
+    print(f"{'mode':>10} {'seconds':>8} {'vehicles/s':>11} {'meter entries':>14} {'429s':>6}")
+    for mode in ('unpaced', 'scheduled'):
+        paced = mode == 'scheduled'
+        smart_fetch.smartcar_client.scheduler = schedulers[0] if paced else None
+        smart_fetch.fleetio_client.scheduler = schedulers[1] if paced else None
+        # Start each mode with a fresh one-second window
+        time.sleep(1)
+        stub_control(base_url, 'reset')
+        smart_fetch.reset_fleetio_index()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            smart_fetch.sync_vehicles_concurrently('stub-access-token', vehicle_ids, max_workers=args.workers)
+        elapsed = time.perf_counter() - start
+        end_state = stub_control(base_url, 'end_state')
+        print(f"{mode:>10} {elapsed:>8.2f} {len(vehicle_ids) / elapsed:>11.1f} "
+              f"{len(end_state['meters']):>6}/{len(vehicle_ids):<7} {end_state['rejected']:>6}")
+
+    process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Compares fresh-connection requests against the pooled SmartcarClient and
+FleetioClient sessions over HTTPS, using the local stub server.
+
+Usage:
+    python benchmarks/bench_sessions.py --requests 200 --vehicles 50
+"""
+
+import argparse
+import contextlib
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_server import (  # noqa: E402
+    configure_environment,
+    make_self_signed_cert,
+    start_stub_process,
+    stub_control,
+)
+
+
+def timed(func, count):
+    start = time.perf_counter()
+    for i in range(count):
+        func(i)
+    return (time.perf_counter() - start) / count * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200, help="single GETs per variant")
+    parser.add_argument('--vehicles', type=int, default=50, help="vehicles synced per variant")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every stub response")
+    args = parser.parse_args()
+    # Only the results table is of interest; keep the sync's log output out of it
+    logging.disable(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as directory:
+        certfile = make_self_signed_cert(directory)
+        os.environ['REQUESTS_CA_BUNDLE'] = certfile
+        process, base_url = start_stub_process(fleet_size=args.vehicles, latency=args.latency, certfile=certfile)
+        configure_environment(base_url)
+
+        import requests
+        import smart_fetch
+
+        vehicle_ids = smart_fetch.get_vehicle_ids('stub-access-token')
+        odometer_url = f"{smart_fetch.SMARTCAR_API_URL}/vehicles/{vehicle_ids[0]}/odometer"
+
+        fresh = timed(lambda i: requests.get(odometer_url), args.requests)
+        pooled = timed(lambda i: smart_fetch.smartcar_client.get(odometer_url), args.requests)
+        print(f"single GET      fresh connection {fresh:7.2f} ms   pooled {pooled:7.2f} ms   "
+              f"({fresh / pooled:.1f}x)")
+
+        def sync(i):
+            smart_fetch.sync_vehicle('stub-access-token', vehicle_ids[i % len(vehicle_ids)])
+
+        results = {}
+        for label, connection in (('fresh connection', 'close'), ('pooled', 'keep-alive')):
+            for client in (smart_fetch.smartcar_client, smart_fetch.fleetio_client):
+                client.session.headers['Connection'] = connection
+            stub_control(base_url, 'reset')
+            smart_fetch.reset_fleetio_index()
+            with contextlib.redirect_stdout(io.StringIO()):
+                results[label] = timed(sync, args.vehicles)
+        print(f"per-vehicle sync fresh connection {results['fresh connection']:7.2f} ms   "
+              f"pooled {results['pooled']:7.2f} ms   "
+              f"({results['fresh connection'] / results['pooled']:.1f}x)")
+
+        process.terminate()
+
+
+if __name__ == "__main__":
+    main()
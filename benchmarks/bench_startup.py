@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Measures how long each entry point takes to start, for frequent short runs.
+
+For the REST (smart_fetch.py) and SDK (smart_fetch_sdk.py) backends,
+times fresh interpreter processes that only import the script, print
+--help, drain an empty outbox, and sync a one-vehicle fleet on the local
+stub server, and reports the median of --repeat runs. The last column
+shows whether importing the script loaded the smartcar SDK; it should
+only load once the SDK backend is first used.
+
+Usage:
+    python benchmarks/bench_startup.py --repeat 10
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from stub_server import configure_environment, start_stub_process  # noqa: E402
+
+# name -> (script, module)
+MODES = {
+    'rest': ('smart_fetch.py', 'smart_fetch'),
+    'sdk': ('smart_fetch_sdk.py', 'smart_fetch_sdk'),
+}
+
+
+def run(command, directory, repeat):
+    """
+    Runs command `repeat` times in directory and returns the median wall time in milliseconds.
+    """
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        completed = subprocess.run(command, cwd=directory, capture_output=True, text=True)
+        times.append((time.perf_counter() - started) * 1000)
+        if completed.returncode != 0:
+            raise RuntimeError(f"{' '.join(command)} failed:\n{completed.stderr}")
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help="runs per measurement (the median is shown)")
+    parser.add_argument('--modes', default=','.join(MODES), help="comma-separated modes: " + ', '.join(MODES))
+    args = parser.parse_args()
+
+    process, base_url = start_stub_process(fleet_size=1, latency=0, rate_limit=None)
+    configure_environment(base_url)
+    os.environ.update({'METRICS_JSONL_PATH': '', 'METRICS_PROMETHEUS_PATH': '', 'PYTHONPATH': ROOT})
+
+    python = sys.executable
+    baseline = run([python, '-c', 'pass'], ROOT, args.repeat)
+    print(f"Bare interpreter: {baseline:.0f} ms")
+    print(f"{'mode':>6} {'import':>8} {'--help':>8} {'drain':>8} {'1-vehicle':>10} {'SDK at import':>14}")
+    try:
+        for mode in args.modes.split(','):
+            script, module = MODES[mode]
+            script = os.path.join(ROOT, script)
+            probe = f"import sys, {module}; sys.exit(0 if 'smartcar' in sys.modules else 3)"
+            with tempfile.TemporaryDirectory() as directory:
+                imported = run([python, '-c', f'import {module}'], directory, args.repeat)
+                helped = run([python, script, '--help'], directory, args.repeat)
+                drained = run([python, script, '--drain-outbox'], directory, args.repeat)
+                synced = run([python, script], directory, args.repeat)
+                sdk_loaded = subprocess.run([python, '-c', probe], cwd=directory).returncode == 0
+            print(f"{mode:>6} {imported:>8.0f} {helped:>8.0f} {drained:>8.0f} {synced:>10.0f} "
+                  f"{'yes' if sdk_loaded else 'no':>14}")
+    finally:
+        process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Runs each sync mode end to end against the local stub server and reports
+vehicles/second, requests per vehicle and peak memory.
+
+Each mode runs smart_fetch.main() (or smart_fetch_sdk.main()) in a fresh
+process with its own state and outbox files, so the numbers include
+startup, the Fleetio index load and the final outbox drain, and peak RSS
+is that of the sync alone. Steady-state modes first run a cold sync
+(not measured), then move a share of the fleet on before the timed run.
+Use --error-rate and --limit to measure the cost of retries and 429s, and
+--slow-make to see how one slow carmaker backend affects the run.
+
+Usage:
+    python benchmarks/bench_sync_modes.py --vehicles 1000 --latency 0.02 --workers 16
+    python benchmarks/bench_sync_modes.py --vehicles 50000 --latency 0 --modes concurrent,steady
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_server import configure_environment, parse_make_latency, start_stub_process, stub_control  # noqa: E402
+
+# name -> (module, environment, warm); the worker count fills in {workers}
+MODES = {
+    'serial': ('smart_fetch', {'SYNC_MAX_WORKERS': '1'}, False),
+    'concurrent': ('smart_fetch', {'SYNC_MAX_WORKERS': '{workers}'}, False),
+    'no-batch': ('smart_fetch', {'SYNC_MAX_WORKERS': '{workers}', 'SMARTCAR_BATCH': 'false'}, False),
+    'no-outbox': ('smart_fetch', {'SYNC_MAX_WORKERS': '{workers}', 'FLEETIO_OUTBOX_PATH': ''}, False),
+    'no-state': ('smart_fetch', {'SYNC_MAX_WORKERS': '{workers}', 'SYNC_STATE_PATH': ''}, False),
+    'steady': ('smart_fetch', {'SYNC_MAX_WORKERS': '{workers}'}, True),
+    'hedged': ('smart_fetch', {'SYNC_MAX_WORKERS': '{workers}', 'SMARTCAR_HEDGE': 'true'}, True),
+    'sdk': ('smart_fetch_sdk', {'SYNC_MAX_WORKERS': '{workers}'}, False),
+    'sdk-steady': ('smart_fetch_sdk', {'SYNC_MAX_WORKERS': '{workers}'}, True),
+}
+
+
+def run_child(module):
+    """
+    Runs one sync in this process and prints its timing and peak memory as JSON.
+    """
+    import logging
+    import resource
+
+    logging.disable(logging.CRITICAL)
+    started = time.perf_counter()
+    # Importing is part of the cost: clients, schedulers and dependencies load here
+    sync = __import__(module)
+    sync.main()
+    seconds = time.perf_counter() - started
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    print(json.dumps({'seconds': seconds, 'peak_mb': peak_mb}))
+
+
+def run_mode(module, environment, directory):
+    """
+    Runs run_child(module) in a subprocess working in directory and returns its result.
+    """
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', module],
+        cwd=directory, env=dict(os.environ, **environment), capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{module} failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=1000, help="synthetic fleet size (10 to 50000)")
+    parser.add_argument('--latency', type=float, default=0.02, help="seconds added to every stub response")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of stub requests failing with a 5xx")
+    parser.add_argument('--limit', type=int, help="stub requests/second allowed per API (default: unlimited)")
+    parser.add_argument('--no-retry-after', action='store_true', help="stub 429s carry no Retry-After")
+    parser.add_argument('--slow-make', action='append', default=[], metavar='MAKE=SECONDS',
+                        help="extra latency for one make's Smartcar requests (repeatable)")
+    parser.add_argument('--workers', type=int, default=16, help="SYNC_MAX_WORKERS for every mode but serial")
+    parser.add_argument('--moved', type=float, default=0.1, help="share of the fleet driven between steady-state runs")
+    parser.add_argument('--modes', default=','.join(MODES), help="comma-separated modes: " + ', '.join(MODES))
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return run_child(args.child)
+
+    modes = args.modes.split(',')
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(unknown)}")
+
+    process, base_url = start_stub_process(
+        fleet_size=args.vehicles, latency=args.latency, rate_limit=args.limit,
+        error_rate=args.error_rate, retry_after=not args.no_retry_after, seed=0,
+        make_latency=parse_make_latency(args.slow_make)
+    )
+    configure_environment(base_url)
+    workers = str(args.workers)
+    os.environ.update({
+        'SMARTCAR_MAX_CONCURRENCY': workers, 'FLEETIO_MAX_CONCURRENCY': workers,
+        'METRICS_JSONL_PATH': '', 'METRICS_PROMETHEUS_PATH': '',
+        # The stub fleet drives km in the seconds between runs; keep the check, not the rejections
+        'ODOMETER_MAX_SPEED': '1e9',
+    })
+    if args.limit:
+        os.environ.update({
+            'SMARTCAR_RATE_LIMIT': str(args.limit), 'SMARTCAR_RATE_BURST': str(args.limit),
+            'FLEETIO_RATE_LIMIT': str(args.limit), 'FLEETIO_RATE_BURST': str(args.limit),
+        })
+
+    print(f"{'mode':>11} {'seconds':>8} {'vehicles/s':>11} {'req/vehicle':>12} {'peak MB':>8} "
+          f"{'meters':>8} {'429s':>6} {'5xx':>6}")
+    try:
+        for mode in modes:
+            module, environment, warm = MODES[mode]
+            environment = {key: value.format(workers=workers) for key, value in environment.items()}
+            with tempfile.TemporaryDirectory() as directory:
+                stub_control(base_url, 'reset')
+                if warm:
+                    run_mode(module, environment, directory)
+                    stub_control(base_url, 'advance', km=5.0, fraction=args.moved)
+                    meters_before = len(stub_control(base_url, 'end_state')['meters'])
+                    stub_control(base_url, 'reset_counters')
+                else:
+                    meters_before = 0
+                if args.limit:
+                    # Start each mode with a fresh one-second window
+                    time.sleep(1)
+                result = run_mode(module, environment, directory)
+            end_state = stub_control(base_url, 'end_state')
+            print(f"{mode:>11} {result['seconds']:>8.2f} {args.vehicles / result['seconds']:>11.1f} "
+                  f"{end_state['requests'] / args.vehicles:>12.2f} {result['peak_mb']:>8.1f} "
+                  f"{len(end_state['meters']) - meters_before:>8} {end_state['rejected']:>6} {end_state['errors']:>6}")
+    finally:
+        process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Smartcar and Fleetio APIs, used by the benchmarks.
+
+Serves both APIs from one port: Smartcar (vehicle, VIN, odometer and
+batch) under /v1.0, and /v2.0 for the smartcar SDK, and Fleetio under
+/api/v1. Every response is delayed by a fixed latency to mimic network
+round trips, so the benchmarks measure how well the sync overlaps waiting.
+Optionally a fraction of API requests fail with a 5xx, and each API
+answers 429 (with or without Retry-After) past a per-second limit. Fleets
+of up to tens of thousands of synthetic vehicles are indexed so lookups
+stay cheap. Fleetio records carry updated_at; the vehicle list takes a
+q[updated_at_gteq] filter and answers a matching If-None-Match with 304.
+The server runs in its own process so it does not compete with the
+client under test for the GIL; /_stub/reset, /_stub/reset_counters,
+/_stub/advance and /_stub/end_state control it.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import re
+import ssl
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from hashlib import md5
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+# Makes and models handed out to the synthetic fleet in turn
+STUB_MODELS = (('TOYOTA', 'Prius'), ('FORD', 'F-150'), ('TESLA', 'Model 3'), ('BMW', 'i3'))
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+
+
+class StubState:
+    """
+    In-memory fleet shared by the Smartcar and Fleetio stand-ins.
+    """
+
+    def __init__(self, fleet_size=100, latency=0.05, rate_limit=None, error_rate=0.0, retry_after=True, seed=None,
+                 make_latency=None):
+        self.latency = latency
+        # Extra seconds per Smartcar vehicle request by make, like a slow carmaker backend
+        self.make_latency = make_latency or {}
+        # Requests per second per API prefix before answering 429 (None = unlimited)
+        self.rate_limit = rate_limit
+        # Whether 429s say when to retry
+        self.retry_after = retry_after
+        # Fraction of API requests (token grants excepted) answered with a random 5xx
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._windows = {}
+        # Numbers the request IDs of error responses
+        self.error_ids = 0
+        self.lock = threading.Lock()
+        self.smartcar_vehicles = {
+            f"sc-{i:06d}": {
+                'id': f"sc-{i:06d}",
+                'make': STUB_MODELS[i % len(STUB_MODELS)][0],
+                'model': STUB_MODELS[i % len(STUB_MODELS)][1],
+                'year': 2015 + i % 10,
+                'vin': f"STUBVIN{i:010d}",
+                'distance': 10000.0 + i,
+            }
+            for i in range(fleet_size)
+        }
+        self.smartcar_ids = list(self.smartcar_vehicles)
+        self.reset_fleetio()
+
+    def reset_counters(self):
+        with self.lock:
+            self.request_count = 0
+            self.rejected_count = 0
+            self.error_count = 0
+            self.token_refreshes = 0
+
+    def reset_fleetio(self):
+        with self.lock:
+            self.fleetio_vehicles = {}
+            # Insertion order for cursor pages, and VIN lookups without a scan
+            self.fleetio_order = []
+            self.fleetio_by_vin = {}
+            self.meter_entries = []
+            self._next_fleetio_id = 1
+        self.reset_counters()
+
+    def advance(self, km, fraction=1.0):
+        """
+        Drives a fraction of the fleet forward by km, as if it had been used since the last sync.
+
+        Returns the number of vehicles moved.
+        """
+        with self.lock:
+            moved = self._random.sample(self.smartcar_ids, int(len(self.smartcar_ids) * fraction))
+            for vehicle_id in moved:
+                self.smartcar_vehicles[vehicle_id]['distance'] += km
+        return len(moved)
+
+    def injected_error(self):
+        """
+        Returns a 5xx status to fail the current request with, or None.
+        """
+        if not self.error_rate:
+            return None
+        with self.lock:
+            if self._random.random() >= self.error_rate:
+                return None
+            self.error_count += 1
+            return self._random.choice((500, 502, 503))
+
+    def over_limit(self, api):
+        """
+        Counts a request against its API's one-second window; returns seconds until
+        the window resets if the limit is exceeded, else None.
+        """
+        if not self.rate_limit:
+            return None
+        now = time.time()
+        with self.lock:
+            window, count = self._windows.get(api, (int(now), 0))
+            if window != int(now):
+                window, count = int(now), 0
+            count += 1
+            self._windows[api] = (window, count)
+            if count > self.rate_limit:
+                self.rejected_count += 1
+                return window + 1 - now
+        return None
+
+    def create_fleetio_vehicle(self, payload):
+        with self.lock:
+            vehicle_id = self._next_fleetio_id
+            self._next_fleetio_id += 1
+            record = dict(payload, id=vehicle_id, updated_at=_now())
+            self.fleetio_vehicles[vehicle_id] = record
+            self.fleetio_order.append(record)
+            if record.get('vin'):
+                self.fleetio_by_vin.setdefault(record['vin'], record)
+            return record
+
+    def end_state(self):
+        """
+        Returns a comparable summary of what the sync wrote to Fleetio.
+        """
+        with self.lock:
+            vins = sorted(v.get('vin') for v in self.fleetio_vehicles.values())
+            meters = sorted(
+                (self.fleetio_vehicles[e['vehicle_id']]['vin'], round(e['value'], 2))
+                for e in self.meter_entries
+            )
+            return vins, meters
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, keep-alive
+    # connections stall on Nagle + delayed ACK
+    disable_nagle_algorithm = True
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, etag=False, headers=None):
+        data = json.dumps(body).encode()
+        headers = dict(headers or {})
+        if etag:
+            headers['ETag'] = f'W/"{md5(data).hexdigest()}"'
+            if self.headers.get('If-None-Match') == headers['ETag']:
+                status, data = 304, b''
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, url, status, error_type, description, code=None, headers=None):
+        """
+        Answers with an error: in Smartcar's v2 format on Smartcar paths, which the SDK
+        parses into a SmartcarException with status_code (and retry_after), else Fleetio-style.
+        """
+        if url.path.startswith('/api/'):
+            return self._send(status, {'error': description}, headers=headers)
+        with self.state.lock:
+            self.state.error_ids += 1
+            request_id = f"stub-{self.state.error_ids:08d}"
+        return self._send(status, {
+            'type': error_type, 'code': code, 'statusCode': status,
+            'description': description, 'requestId': request_id
+        }, headers=dict(headers or {}, **{'SC-Request-Id': request_id}))
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _begin(self):
+        """
+        Parses the request URL and applies latency, rate limiting, injected errors and token expiry.
+
+        Returns None after answering 429, 5xx or 401 itself, in which case the handler stops.
+        The Smartcar stand-in rejects the access token 'stub-expired-token'.
+        """
+        url = urlparse(self.path)
+        if url.path.startswith('/_stub/'):
+            return url
+        with self.state.lock:
+            self.state.request_count += 1
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        retry_after = self.state.over_limit(url.path.split('/')[1])
+        if retry_after is not None:
+            self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            self._error(url, 429, 'RATE_LIMIT', 'You have reached the throttling rate limit for this application.',
+                        code='VEHICLE' if '/vehicles/' in url.path else 'SMARTCAR_API',
+                        headers={'Retry-After': f"{retry_after:.3f}"} if self.state.retry_after else None)
+            return None
+        status = self.state.injected_error() if url.path != '/oauth/token' else None
+        if status is not None:
+            self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            self._error(url, status, 'SERVER', 'INJECTED_FAILURE', code='INTERNAL')
+            return None
+        if re.match(r'/v[12]\.0/', url.path) and self.headers.get('Authorization') == 'Bearer stub-expired-token':
+            self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            self._error(url, 401, 'AUTHENTICATION', 'The provided access token is invalid or expired.')
+            return None
+        return url
+
+    def _smartcar_signal(self, vehicle_id, path):
+        """
+        Returns (status, body) for one Smartcar vehicle path: '/', '/vin' or '/odometer'.
+        """
+        vehicle = self.state.smartcar_vehicles.get(vehicle_id)
+        if not vehicle:
+            return 404, {'type': 'RESOURCE_NOT_FOUND', 'code': 'VEHICLE', 'statusCode': 404,
+                         'description': 'The vehicle was not found.'}
+        if vehicle['make'] in self.state.make_latency:
+            time.sleep(self.state.make_latency[vehicle['make']])
+        if path == '/vin':
+            return 200, {'vin': vehicle['vin']}
+        if path == '/odometer':
+            return 200, {'distance': vehicle['distance']}
+        if path == '/':
+            return 200, {k: vehicle[k] for k in ('id', 'make', 'model', 'year')}
+        return 404, {'type': 'RESOURCE_NOT_FOUND', 'code': 'PATH', 'statusCode': 404,
+                     'description': 'The requested path does not exist.'}
+
+    def do_GET(self):
+        url = self._begin()
+        if url is None:
+            return
+        path, query = url.path, parse_qs(url.query)
+        smartcar = self.state.smartcar_vehicles
+
+        if path == '/_stub/end_state':
+            vins, meters = self.state.end_state()
+            return self._send(200, {
+                'vins': vins, 'meters': meters,
+                'requests': self.state.request_count, 'rejected': self.state.rejected_count,
+                'errors': self.state.error_count, 'token_refreshes': self.state.token_refreshes
+            })
+        if re.fullmatch(r'/v[12]\.0/vehicles', path):
+            # limit/offset paging with Smartcar's default page size of 10
+            ids = self.state.smartcar_ids
+            limit = int(query.get('limit', ['10'])[0])
+            offset = int(query.get('offset', ['0'])[0])
+            return self._send(200, {'vehicles': ids[offset:offset + limit], 'paging': {'count': len(ids), 'offset': offset}})
+        match = re.fullmatch(r'/v[12]\.0/vehicles/([^/]+)(/vin|/odometer|/)?', path)
+        if match:
+            return self._send(*self._smartcar_signal(match.group(1), match.group(2) or '/'))
+
+        if path == '/api/v1/vehicles':
+            if 'q[vin_eq]' in query:
+                record = self.state.fleetio_by_vin.get(query['q[vin_eq]'][0])
+                records = [record] if record else []
+            else:
+                records = self.state.fleetio_order
+            if 'q[updated_at_gteq]' in query:
+                since = datetime.fromisoformat(query['q[updated_at_gteq]'][0])
+                records = [r for r in records if datetime.fromisoformat(r['updated_at']) >= since]
+            # Cursor pagination: the cursor is simply the offset of the next page
+            per_page = int(query.get('per_page', ['100'])[0])
+            start = int(query.get('start_cursor', ['0'])[0])
+            page = records[start:start + per_page]
+            next_cursor = str(start + per_page) if start + per_page < len(records) else None
+            return self._send(200, {'records': page, 'next_cursor': next_cursor}, etag=True)
+        match = re.fullmatch(r'/api/v1/vehicles/(\d+)', path)
+        if match:
+            record = self.state.fleetio_vehicles.get(int(match.group(1)))
+            if record:
+                return self._send(200, record)
+            return self._send(404, {'error': 'Not Found'})
+
+        self._send(404, {'error': 'Not Found'})
+
+    def do_POST(self):
+        url = self._begin()
+        if url is None:
+            return
+        if url.path == '/oauth/token':
+            # Form-encoded grant; every refresh rotates both tokens
+            self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            with self.state.lock:
+                self.state.token_refreshes += 1
+                n = self.state.token_refreshes
+            return self._send(200, {
+                'access_token': f"stub-access-token-{n}", 'refresh_token': f"stub-refresh-token-{n}",
+                'token_type': 'Bearer', 'expires_in': 7200
+            })
+        payload = self._read_json()
+
+        if url.path == '/_stub/reset':
+            self.state.reset_fleetio()
+            return self._send(200, {})
+        if url.path == '/_stub/reset_counters':
+            self.state.reset_counters()
+            return self._send(200, {})
+        if url.path == '/_stub/advance':
+            return self._send(200, {'moved': self.state.advance(payload.get('km', 1.0), payload.get('fraction', 1.0))})
+        match = re.fullmatch(r'/v[12]\.0/vehicles/([^/]+)/batch', url.path)
+        if match:
+            responses = []
+            for request in payload.get('requests', []):
+                code, body = self._smartcar_signal(match.group(1), request['path'])
+                responses.append({'path': request['path'], 'code': code, 'body': body, 'headers': {}})
+            return self._send(200, {'responses': responses})
+        if url.path == '/api/v1/vehicles':
+            return self._send(201, self.state.create_fleetio_vehicle(payload))
+        if url.path == '/api/v1/meter_entries':
+            if payload.get('vehicle_id') not in self.state.fleetio_vehicles:
+                return self._send(422, {'errors': {'vehicle_id': ['does not exist']}})
+            with self.state.lock:
+                self.state.meter_entries.append(payload)
+                # Like Fleetio, a meter entry moves the vehicle's current meter value
+                record = self.state.fleetio_vehicles[payload['vehicle_id']]
+                record.update(current_meter_value=payload.get('value'), updated_at=_now())
+            return self._send(201, dict(payload, id=len(self.state.meter_entries)))
+
+        self._send(404, {'error': 'Not Found'})
+
+    def do_PUT(self):
+        url = self._begin()
+        if url is None:
+            return
+        payload = self._read_json()
+
+        match = re.fullmatch(r'/api/v1/vehicles/(\d+)', url.path)
+        if match and int(match.group(1)) in self.state.fleetio_vehicles:
+            with self.state.lock:
+                record = self.state.fleetio_vehicles[int(match.group(1))]
+                record.update(payload, updated_at=_now())
+            return self._send(200, record)
+
+        self._send(404, {'error': 'Not Found'})
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that time out hang up mid-response; that is expected, not a stub failure
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def start_stub_server(state, host='127.0.0.1', port=0, certfile=None):
+    """
+    Starts the stub server on a background thread and returns (server, base_url).
+
+    When certfile (a PEM holding both certificate and key) is given the
+    server speaks HTTPS, so TLS handshake costs show up in the benchmarks.
+    """
+    handler = type('BoundStubHandler', (StubHandler,), {'state': state})
+    server = StubServer((host, port), handler)
+    scheme = 'http'
+    if certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = 'https'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://{host}:{server.server_address[1]}"
+
+
+def _serve(state_options, certfile, port_queue):
+    server, base_url = start_stub_server(StubState(**state_options), certfile=certfile)
+    port_queue.put(base_url)
+    threading.Event().wait()
+
+
+def start_stub_process(fleet_size=100, latency=0.05, certfile=None, rate_limit=None, error_rate=0.0,
+                       retry_after=True, seed=None, make_latency=None):
+    """
+    Starts the stub server in a child process and returns (process, base_url).
+    """
+    state_options = dict(fleet_size=fleet_size, latency=latency, rate_limit=rate_limit,
+                         error_rate=error_rate, retry_after=retry_after, seed=seed, make_latency=make_latency)
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=_serve, args=(state_options, certfile, port_queue), daemon=True
+    )
+    process.start()
+    return process, port_queue.get(timeout=30)
+
+
+def make_self_signed_cert(directory):
+    """
+    Writes a self-signed certificate for 127.0.0.1 with openssl and returns its path.
+
+    The same file serves as the server's cert chain and the client's CA
+    bundle (point REQUESTS_CA_BUNDLE at it).
+    """
+    key_path = os.path.join(directory, 'stub.key')
+    cert_path = os.path.join(directory, 'stub.crt')
+    subprocess.run(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+         '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1',
+         '-keyout', key_path, '-out', cert_path],
+        check=True, capture_output=True
+    )
+    pem_path = os.path.join(directory, 'stub.pem')
+    with open(pem_path, 'w') as pem, open(cert_path) as cert, open(key_path) as key:
+        pem.write(cert.read() + key.read())
+    return pem_path
+
+
+def stub_control(base_url, action, **payload):
+    """
+    Calls a /_stub/ control endpoint: 'reset', 'reset_counters', 'advance' (km, fraction) or 'end_state'.
+    """
+    import requests
+    if action in ('reset', 'reset_counters', 'advance'):
+        return requests.post(f"{base_url}/_stub/{action}", json=payload).json()
+    return requests.get(f"{base_url}/_stub/{action}").json()
+
+
+def parse_make_latency(values):
+    """
+    Turns ['BMW=2.5', ...] into {'BMW': 2.5, ...}.
+    """
+    make_latency = {}
+    for value in values:
+        make, _, seconds = value.partition('=')
+        make_latency[make.strip().upper()] = float(seconds)
+    return make_latency
+
+
+def configure_environment(base_url):
+    """
+    Points smart_fetch and smart_fetch_sdk at the stub server. Must run before either is imported.
+    """
+    os.environ.update({
+        'SMARTCAR_API_URL': f"{base_url}/v1.0",
+        'SMARTCAR_AUTH_URL': f"{base_url}/oauth/token",
+        'FLEETIO_API_URL': f"{base_url}/api/v1",
+        'SMARTCAR_API_ORIGIN': base_url,
+        'SMARTCAR_AUTH_ORIGIN': f"{base_url}/oauth/token",
+        'SMARTCAR_CLIENT_ID': 'stub-client-id',
+        'SMARTCAR_CLIENT_SECRET': 'stub-client-secret',
+        'SMARTCAR_ACCESS_TOKEN': 'stub-access-token',
+        'SMARTCAR_ACCESS_TOKEN_SDK': 'stub-access-token',
+        'SMARTCAR_REFRESH_TOKEN': 'stub-refresh-token',
+        'SMARTCAR_REFRESH_TOKEN_SDK': 'stub-refresh-token',
+        'FLEETIO_API_TOKEN': 'stub-fleetio-token',
+        'FLEETIO_ACCOUNT_TOKEN': 'stub-account-token',
+        # The stub is unlimited unless asked otherwise, so do not pace requests to it
+        'SMARTCAR_RATE_LIMIT': os.environ.get('SMARTCAR_RATE_LIMIT', '100000'),
+        'SMARTCAR_RATE_BURST': os.environ.get('SMARTCAR_RATE_BURST', '100000'),
+        'FLEETIO_RATE_LIMIT': os.environ.get('FLEETIO_RATE_LIMIT', '100000'),
+        'FLEETIO_RATE_BURST': os.environ.get('FLEETIO_RATE_BURST', '100000'),
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Smartcar/Fleetio stub server.")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--vehicles', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--rate-limit', type=int, help="requests/second per API before answering 429")
+    parser.add_argument('--no-retry-after', action='store_true', help="send 429s without Retry-After")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests failing with a 5xx")
+    parser.add_argument('--slow-make', action='append', default=[], metavar='MAKE=SECONDS',
+                        help="extra latency for one make's Smartcar requests (repeatable)")
+    args = parser.parse_args()
+    state = StubState(args.vehicles, args.latency, rate_limit=args.rate_limit,
+                      error_rate=args.error_rate, retry_after=not args.no_retry_after,
+                      make_latency=parse_make_latency(args.slow_make))
+    server, base_url = start_stub_server(state, port=args.port)
+    print(f"Stub server listening on {base_url}")
+    threading.Event().wait()
@@ -0,0 +1,210 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import endpoint_template
+
+SMARTCAR_API_URL = "https://api.smartcar.com/v1.0"
+SMARTCAR_AUTH_URL = "https://auth.smartcar.com/oauth/token"
+FLEETIO_API_URL = "https://secure.fleetio.com/api/v1"
+DEFAULT_TIMEOUT = 30
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS')
+
+
+class ApiClient:
+    """
+    Shared HTTP client for one API host.
+
+    Owns a keep-alive connection pool sized to max_concurrency, the default
+    headers and timeout, and a semaphore that caps in-flight requests so the
+    pool is never asked for more connections than it holds. When a
+    RequestScheduler is given, every request is paced and retried by it.
+    When a RunMetrics is given, every request is recorded in it under the
+    client's `api` name. GETs may be hedged (see request()); `hedged` and
+    `hedge_wins` count how often a hedge was sent and answered first.
+    """
+
+    api = 'api'
+
+    def __init__(self, base_url, headers=None, timeout=DEFAULT_TIMEOUT, max_concurrency=8, scheduler=None,
+                 metrics=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update(headers or {})
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self.scheduler = scheduler
+        self.metrics = metrics
+        self.max_concurrency = max_concurrency
+        self.hedged = self.hedge_wins = 0
+        self._hedge_executor = None
+        self._hedge_lock = threading.Lock()
+
+    def url(self, path):
+        """
+        Resolves a path relative to the client's base URL; absolute URLs pass through.
+        """
+        if path.startswith(('http://', 'https://')):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def endpoint(self, path):
+        """
+        The endpoint a request path is recorded under, relative to the base URL with IDs collapsed.
+        """
+        if path.startswith(self.base_url):
+            path = path[len(self.base_url):]
+        elif path.startswith(('http://', 'https://')):
+            path = '/' + path.split('://', 1)[1].partition('/')[2]
+        return endpoint_template('/' + path.lstrip('/'))
+
+    def request(self, method, path, hedge_after=None, idempotent=None, **kwargs):
+        """
+        Sends a request, paced and recorded as configured.
+
+        Only idempotent requests are retried after a 5xx or connection error.
+        By default that is decided by the method (IDEMPOTENT_METHODS); pass
+        idempotent=True for a POST that only reads, like a Smartcar batch.
+
+        With hedge_after (seconds), a GET that has not been answered by then
+        is sent a second time and whichever copy answers first wins; the
+        other is left to finish in the background. Meant to be set around the
+        endpoint's usual p95 so only the slow tail is duplicated.
+        """
+        if hedge_after is not None and method.upper() == 'GET':
+            return self._hedged(method, path, hedge_after, dict(kwargs, idempotent=idempotent))
+        return self._request(method, path, idempotent=idempotent, **kwargs)
+
+    def _hedged(self, method, path, hedge_after, kwargs):
+        with self._hedge_lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(self.max_concurrency * 2, thread_name_prefix=f'{self.api}-hedge')
+        first = self._hedge_executor.submit(self._request, method, path, **kwargs)
+        done, _ = wait([first], timeout=hedge_after)
+        if done:
+            return first.result()
+        hedge = self._hedge_executor.submit(self._request, method, path, **kwargs)
+        with self._hedge_lock:
+            self.hedged += 1
+        pending = {first, hedge}
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            answered = [future for future in done if future.exception() is None]
+            if answered:
+                if hedge in answered and first not in answered:
+                    with self._hedge_lock:
+                        self.hedge_wins += 1
+                return answered[0].result()
+            if not pending:
+                # Both copies failed
+                return first.result()
+
+    def _request(self, method, path, idempotent=None, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        url = self.url(path)
+        attempts, on_wire = 0, 0.0
+
+        def send():
+            nonlocal attempts, on_wire
+            attempts += 1
+            # Hold a connection slot only while on the wire, not while backing off
+            with self._slots:
+                started = time.perf_counter()
+                try:
+                    return self.session.request(method, url, **kwargs)
+                finally:
+                    on_wire += time.perf_counter() - started
+
+        started = time.perf_counter()
+        status, size = 'error', 0
+        try:
+            if self.scheduler is None:
+                response = send()
+            else:
+                response = self.scheduler.send(send, idempotent=idempotent)
+            status, size = response.status_code, len(response.content or b'')
+            return response
+        finally:
+            if self.metrics is not None:
+                self.metrics.record_request(
+                    self.api, method.upper(), self.endpoint(path), status, on_wire,
+                    wait=time.perf_counter() - started - on_wire, size=size, retries=max(0, attempts - 1)
+                )
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+    def close(self):
+        if self._hedge_executor is not None:
+            self._hedge_executor.shutdown(wait=False)
+        self.session.close()
+
+
+class SmartcarClient(ApiClient):
+    """
+    Client for the Smartcar REST API and its OAuth token endpoint.
+
+    When a TokenManager is attached, authenticated requests always use its
+    current access token, and a 401 triggers one (single-flight) refresh
+    and retry.
+    """
+
+    api = 'smartcar'
+
+    def __init__(self, base_url=SMARTCAR_API_URL, auth_url=SMARTCAR_AUTH_URL, token_manager=None, **kwargs):
+        super().__init__(base_url, **kwargs)
+        self.auth_url = auth_url
+        self.token_manager = token_manager
+
+    def _authorized(self, method, path, access_token, kwargs):
+        if access_token:
+            kwargs = dict(kwargs, headers=dict(kwargs.get('headers') or {}, Authorization=f'Bearer {access_token}'))
+        return super().request(method, path, **kwargs)
+
+    def request(self, method, path, access_token=None, **kwargs):
+        if not access_token or self.token_manager is None:
+            return self._authorized(method, path, access_token, kwargs)
+        # A token captured before a refresh is superseded by the manager's current one
+        access_token = self.token_manager.get() or access_token
+        response = self._authorized(method, path, access_token, kwargs)
+        if response.status_code == 401:
+            fresh_token = self.token_manager.invalidate(access_token)
+            if fresh_token and fresh_token != access_token:
+                response = self._authorized(method, path, fresh_token, kwargs)
+        return response
+
+    def post_token(self, data):
+        """
+        Posts a grant to the OAuth token endpoint.
+        """
+        return self.request('POST', self.auth_url, data=data)
+
+
+class FleetioClient(ApiClient):
+    """
+    Client for the Fleetio REST API, authenticated with the API and account tokens.
+    """
+
+    api = 'fleetio'
+
+    def __init__(self, api_token, account_token, base_url=FLEETIO_API_URL, **kwargs):
+        headers = {
+            'Authorization': f'Token token={api_token}',
+            'Account-Token': account_token,
+            'Content-Type': 'application/json'
+        }
+        super().__init__(base_url, headers=headers, **kwargs)
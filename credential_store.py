@@ -0,0 +1,96 @@
+import contextlib
+import os
+import shutil
+import tempfile
+import threading
+
+from dotenv import dotenv_values
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are serialized
+    fcntl = None
+
+
+class CredentialStore:
+    """
+    Credentials kept in a dotenv file, shared safely by threads and processes.
+
+    The file is read once and cached. update() writes only when a value
+    changed: it writes a temporary file in the same directory and renames it
+    over the original, so readers never see a partial file. Writers hold an
+    exclusive lock on `<path>.lock` and re-read the file first, so
+    overlapping runs do not lose each other's changes. Values in the file
+    take precedence over environment variables of the same name.
+    """
+
+    def __init__(self, path='.env'):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._lock_file = None
+        self._values = None
+
+    @contextlib.contextmanager
+    def locked(self):
+        """
+        Holds the store's exclusive lock, e.g. across reading, refreshing and saving a token.
+        """
+        with self._lock:
+            if self._depth == 0 and fcntl is not None:
+                self._lock_file = open(f"{self.path}.lock", 'a')
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._depth += 1
+            try:
+                yield self
+            finally:
+                self._depth -= 1
+                if self._depth == 0 and self._lock_file is not None:
+                    # Closing the file releases the lock
+                    self._lock_file.close()
+                    self._lock_file = None
+
+    def reload(self):
+        """
+        Re-reads the file, replacing the cached values, and returns them.
+        """
+        with self._lock:
+            values = dotenv_values(self.path) if os.path.exists(self.path) else {}
+            self._values = {key: value for key, value in values.items() if value is not None}
+            return dict(self._values)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if self._values is None:
+                self.reload()
+            value = self._values.get(key)
+        return value if value is not None else os.getenv(key, default)
+
+    def update(self, values):
+        """
+        Persists the given values atomically. Returns True if the file had to be written.
+        """
+        with self.locked():
+            current = self.reload()
+            changed = {key: value for key, value in values.items() if current.get(key) != value}
+            if not changed:
+                return False
+            current.update(changed)
+
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.credentials.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as temp_file:
+                    for key, value in current.items():
+                        temp_file.write(f"{key}={value}\n")
+                    temp_file.flush()
+                    os.fsync(temp_file.fileno())
+                if os.path.exists(self.path):
+                    shutil.copymode(self.path, temp_path)
+                os.replace(temp_path, self.path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                raise
+            self._values = current
+            return True
@@ -0,0 +1,315 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Fleetio caps per_page at 100
+FLEETIO_PAGE_SIZE = 100
+
+
+def normalize_vin(vin):
+    """
+    Normalizes a VIN for comparison: surrounding whitespace removed, upper case.
+    """
+    return vin.strip().upper() if vin else None
+
+
+class VehicleLookup:
+    """
+    Result of a Fleetio vehicle lookup: the full vehicle record and when it was fetched.
+
+    Carries everything the sync needs (ID, current meter value, attributes)
+    so no follow-up GET on /vehicles/{id} is required.
+    """
+
+    def __init__(self, record, fetched_at=None):
+        self.record = record
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+
+    @property
+    def id(self):
+        return self.record.get('id')
+
+    @property
+    def current_meter_value(self):
+        return self.record.get('current_meter_value')
+
+    def age(self):
+        """
+        Seconds since the record was fetched from Fleetio.
+        """
+        return time.time() - self.fetched_at
+
+    def is_stale(self, ttl):
+        return self.age() > ttl
+
+
+class FleetioVehicleIndex:
+    """
+    In-memory index of Fleetio vehicle records keyed by ID and normalized VIN.
+
+    Built once per run from the paged vehicle list so per-vehicle lookups are
+    answered locally instead of with one search request each. Vehicles created
+    during the run are added so later lookups see them. Lookups return
+    VehicleLookup objects.
+    """
+
+    def __init__(self, records=()):
+        self._by_id = {}
+        self._by_vin = {}
+        self._lock = threading.Lock()
+        for record in records:
+            self.add(record)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._by_id)
+
+    def add(self, record, fetched_at=None):
+        """
+        Inserts or replaces a vehicle record and returns its VehicleLookup.
+        """
+        lookup = VehicleLookup(record, fetched_at)
+        vin = normalize_vin(record.get('vin'))
+        with self._lock:
+            replaced = self._by_id.get(lookup.id)
+            if replaced is not None:
+                # A changed VIN must not keep answering for the old one
+                old_vin = normalize_vin(replaced.record.get('vin'))
+                if old_vin and self._by_vin.get(old_vin) is replaced:
+                    del self._by_vin[old_vin]
+            self._by_id[lookup.id] = lookup
+            if vin:
+                self._by_vin[vin] = lookup
+        return lookup
+
+    def remove(self, vehicle_id):
+        """
+        Drops a vehicle record, e.g. one deleted in Fleetio.
+        """
+        with self._lock:
+            removed = self._by_id.pop(vehicle_id, None)
+            vin = normalize_vin(removed.record.get('vin')) if removed else None
+            if vin and self._by_vin.get(vin) is removed:
+                del self._by_vin[vin]
+
+    def find_by_id(self, vehicle_id):
+        with self._lock:
+            return self._by_id.get(vehicle_id)
+
+    def find_by_vin(self, vin):
+        vin = normalize_vin(vin)
+        with self._lock:
+            return self._by_vin.get(vin) if vin else None
+
+
+def iter_fleetio_vehicles(fleetio_client, per_page=FLEETIO_PAGE_SIZE, filters=None):
+    """
+    Yields every Fleetio vehicle record, following next_cursor page by page.
+
+    filters are extra query parameters such as {'q[updated_at_gteq]': ...}.
+    Raises requests.HTTPError if a page cannot be fetched.
+    """
+    params = dict(filters or {}, per_page=per_page)
+    while True:
+        response = fleetio_client.get('/vehicles', params=params)
+        response.raise_for_status()
+        data = response.json()
+        yield from data.get('records', [])
+        next_cursor = data.get('next_cursor')
+        if not next_cursor:
+            return
+        params = dict(filters or {}, per_page=per_page, start_cursor=next_cursor)
+
+
+def load_fleetio_index(fleetio_client, per_page=FLEETIO_PAGE_SIZE):
+    """
+    Pages through the Fleetio vehicle list once and returns a FleetioVehicleIndex.
+
+    Returns None if the listing fails, so callers can fall back to per-vehicle searches.
+    """
+    try:
+        index = FleetioVehicleIndex(iter_fleetio_vehicles(fleetio_client, per_page))
+    except Exception as e:
+        logger.warning("Error loading Fleetio vehicle list, falling back to per-vehicle searches: %s", e)
+        return None
+    logger.info("Loaded %d Fleetio vehicles into the lookup index.", len(index))
+    return index
+
+
+def _parse_time(value):
+    """
+    Parses a Fleetio ISO 8601 timestamp, or returns None.
+    """
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _newest(timestamps, newest=None):
+    """
+    Returns the latest of newest and the given ISO 8601 timestamps, as the original string.
+    """
+    for value in timestamps:
+        parsed = _parse_time(value)
+        if parsed is not None and (newest is None or parsed > _parse_time(newest)):
+            newest = value
+    return newest
+
+
+class FleetioVehicleCache:
+    """
+    Persistent local copy of the Fleetio vehicle list, kept current with delta requests.
+
+    The first refresh pages through the whole list. Later ones ask only for
+    vehicles updated at or after the newest updated_at seen
+    (q[updated_at_gteq]), with the ETag of the last answer in If-None-Match,
+    so a cycle without changes costs a single 304 and one with changes
+    costs about one page per hundred changed vehicles. Records are kept in
+    SQLite, so a new process starts from its local copy instead of the full
+    list, and the in-memory FleetioVehicleIndex is reused across daemon
+    cycles. Vehicles deleted in Fleetio never show up in a delta; the full
+    list is reloaded once the last full load is older than full_refresh_age
+    seconds. Safe to share between worker threads.
+    """
+
+    def __init__(self, path, full_refresh_age=7 * 24 * 3600):
+        self.path = path
+        self.full_refresh_age = full_refresh_age
+        self.index = None
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS vehicles (
+                    id INTEGER PRIMARY KEY,
+                    updated_at TEXT,
+                    fetched_at REAL,
+                    record TEXT
+                )
+                """
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _meta(self):
+        return dict(self._conn.execute("SELECT key, value FROM meta"))
+
+    def _store(self, records, fetched_at, meta, replace=False):
+        with self._conn:
+            if replace:
+                self._conn.execute("DELETE FROM vehicles")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vehicles (id, updated_at, fetched_at, record) VALUES (?, ?, ?, ?)",
+                [(record.get('id'), record.get('updated_at'), fetched_at, json.dumps(record)) for record in records]
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [(key, value) for key, value in meta.items()]
+            )
+
+    def _load_local(self):
+        index = FleetioVehicleIndex()
+        for fetched_at, record in self._conn.execute("SELECT fetched_at, record FROM vehicles ORDER BY id"):
+            index.add(json.loads(record), fetched_at)
+        return index
+
+    def refresh(self, fleetio_client, per_page=FLEETIO_PAGE_SIZE):
+        """
+        Brings the local copy up to date and returns its FleetioVehicleIndex.
+
+        Returns None if Fleetio cannot be read, so callers can fall back to per-vehicle searches.
+        """
+        with self._lock:
+            meta = self._meta()
+            full_loaded_at = float(meta.get('full_loaded_at') or 0)
+            watermark = meta.get('watermark')
+            try:
+                if not watermark or time.time() - full_loaded_at > self.full_refresh_age:
+                    self._full_load(fleetio_client, per_page)
+                else:
+                    if self.index is None:
+                        self.index = self._load_local()
+                    self._delta_load(fleetio_client, per_page, meta)
+            except Exception as e:
+                logger.warning("Error loading Fleetio vehicle list, falling back to per-vehicle searches: %s", e)
+                return None
+            return self.index
+
+    def _full_load(self, fleetio_client, per_page):
+        fetched_at = time.time()
+        records = list(iter_fleetio_vehicles(fleetio_client, per_page))
+        watermark = _newest(record.get('updated_at') for record in records)
+        self._store(records, fetched_at, {'watermark': watermark, 'etag': None, 'full_loaded_at': fetched_at},
+                    replace=True)
+        self.index = FleetioVehicleIndex()
+        for record in records:
+            self.index.add(record, fetched_at)
+        logger.info("Loaded %d Fleetio vehicles into the lookup index.", len(self.index))
+        if watermark is None and records:
+            logger.warning("Fleetio vehicle records carry no updated_at; every refresh loads the full list.")
+
+    def _delta_load(self, fleetio_client, per_page, meta):
+        """
+        Merges the vehicles updated since the watermark into the local copy and the index.
+        """
+        fetched_at = time.time()
+        watermark = meta['watermark']
+        # gteq rather than gt: vehicles updated in the same instant as the newest one seen may
+        # not have been listed yet. Those at the watermark come back every time, unchanged.
+        filters = {'q[updated_at_gteq]': watermark}
+        # The ETag belongs to the answer for this exact watermark
+        headers = {'If-None-Match': meta['etag']} if meta.get('etag') and meta.get('etag_for') == watermark else {}
+        response = fleetio_client.get('/vehicles', params=dict(filters, per_page=per_page), headers=headers)
+        if response.status_code == 304:
+            logger.info("Fleetio vehicle list unchanged since the last refresh (%d vehicles known).", len(self.index))
+            return
+        response.raise_for_status()
+        data = response.json()
+        records = list(data.get('records', []))
+        if data.get('next_cursor'):
+            records.extend(iter_fleetio_vehicles(
+                fleetio_client, per_page, dict(filters, start_cursor=data['next_cursor'])
+            ))
+        changed = [record for record in records if not self._is_known(record)]
+        self._store(changed, fetched_at, {
+            'watermark': _newest((record.get('updated_at') for record in records), watermark),
+            'etag': response.headers.get('ETag'), 'etag_for': watermark
+        })
+        for record in changed:
+            self.index.add(record, fetched_at)
+        logger.info("Merged %d updated Fleetio vehicles into the lookup index (%d vehicles known).",
+                    len(changed), len(self.index))
+
+    def _is_known(self, record):
+        known = self.index.find_by_id(record.get('id'))
+        return known is not None and known.record.get('updated_at') == record.get('updated_at')
+
+    def remove(self, vehicle_id):
+        """
+        Drops a vehicle Fleetio no longer accepts writes for. Deletions never show up in a
+        delta, so without this the vehicle would be found again until the next full load.
+        """
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM vehicles WHERE id = ?", (vehicle_id,))
+            if self.index is not None:
+                self.index.remove(vehicle_id)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_fleetio_cache(path, full_refresh_age=7 * 24 * 3600):
+    """
+    Opens the local Fleetio vehicle copy at path, or returns None when path is empty (disabled).
+    """
+    if not path:
+        return None
+    return FleetioVehicleCache(path, full_refresh_age)
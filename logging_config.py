@@ -0,0 +1,50 @@
+import json
+import logging
+import os
+import sys
+
+# DEBUG adds a line per vehicle and per request; WARNING keeps only problems
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "text" for people, "json" for one JSON object per line
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+
+# Attributes every LogRecord has; anything else was passed in `extra`
+_STANDARD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as JSON objects including any fields passed through `extra`.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _STANDARD_ATTRIBUTES})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level=None, log_format=None, stream=None):
+    """
+    Sends log records to stream (stderr by default) at LOG_LEVEL in LOG_FORMAT.
+
+    Called once by each script's entry point; importing modules only get loggers.
+    """
+    handler = logging.StreamHandler(stream or sys.stderr)
+    if (log_format or LOG_FORMAT) == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level or LOG_LEVEL)
+    # Keep third-party request logging out of the sync's DEBUG output
+    logging.getLogger('urllib3').setLevel(logging.WARNING)
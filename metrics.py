@@ -0,0 +1,233 @@
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Path segments containing a digit are IDs; they are collapsed so requests group by endpoint
+_ID_SEGMENT = re.compile(r'/[^/]*\d[^/]*(?=/|$)')
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def endpoint_template(path):
+    """
+    Turns a request path into its endpoint, e.g. /vehicles/4f2c.../odometer -> /vehicles/{id}/odometer.
+    """
+    path = path.split('?', 1)[0]
+    return _ID_SEGMENT.sub('/{id}', path) or '/'
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of an already sorted list, or None when it is empty.
+    """
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+class _Series:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.bytes = 0
+        self.retries = 0
+        self.wait = 0.0
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        row = {'count': len(latencies), 'sum': round(sum(latencies), 6)}
+        for quantile in QUANTILES:
+            row[f"p{quantile * 100:g}"] = _round(percentile(latencies, quantile))
+        row['max'] = _round(latencies[-1]) if latencies else None
+        if self.statuses:
+            row.update({
+                'errors': sum(count for status, count in self.statuses.items()
+                              if status == 'error' or int(status) >= 400),
+                'statuses': dict(self.statuses),
+                'bytes': self.bytes,
+                'retries': self.retries,
+                'wait': round(self.wait, 6),
+            })
+        return row
+
+
+class RunMetrics:
+    """
+    Timing of every outbound request and pipeline stage during one run or sync cycle.
+
+    Requests are grouped by API, method and endpoint, each with its latency
+    (time on the wire, summed over retries), status codes, response bytes,
+    retry count and the time spent waiting on the rate limiter or backing
+    off. Stages are named spans such as one vehicle's fetch or write. Both
+    are summarized as p50/p95/p99 and exported as JSON lines or a
+    Prometheus text file. Safe to share between threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self._requests = {}
+            self._stages = {}
+
+    def record_request(self, api, method, endpoint, status, latency, wait=0.0, size=0, retries=0):
+        """
+        Records one request; status is the HTTP status code or 'error' when no response arrived.
+        """
+        with self._lock:
+            series = self._requests.get((api, method, endpoint))
+            if series is None:
+                series = self._requests[(api, method, endpoint)] = _Series()
+            series.latencies.append(latency)
+            series.statuses[str(status)] = series.statuses.get(str(status), 0) + 1
+            series.bytes += size
+            series.retries += retries
+            series.wait += wait
+        logger.debug(
+            "%s %s %s -> %s in %.3fs (%d bytes, %d retries, %.3fs waiting)",
+            api, method, endpoint, status, latency, size, retries, wait,
+            extra={'api': api, 'method': method, 'endpoint': endpoint, 'status': status,
+                   'latency': latency, 'bytes': size, 'retries': retries, 'wait': wait}
+        )
+
+    def record_stage(self, name, seconds):
+        with self._lock:
+            series = self._stages.get(name)
+            if series is None:
+                series = self._stages[name] = _Series()
+            series.latencies.append(seconds)
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times the enclosed block as one span of the named stage.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(name, time.perf_counter() - started)
+
+    def rows(self):
+        """
+        Returns one summary dict per endpoint and per stage.
+        """
+        with self._lock:
+            requests = [({'kind': 'request', 'api': api, 'method': method, 'endpoint': endpoint}, series.summary())
+                        for (api, method, endpoint), series in sorted(self._requests.items())]
+            stages = [({'kind': 'stage', 'stage': name}, series.summary())
+                      for name, series in sorted(self._stages.items())]
+        return [dict(labels, **summary) for labels, summary in requests + stages]
+
+    def log_summary(self):
+        for row in self.rows():
+            if row['kind'] == 'request':
+                name = f"{row['api']} {row['method']} {row['endpoint']}"
+                extra = f", {row['errors']} errors, {row['retries']} retries, {row['bytes'] / 1024:.1f} KB"
+            else:
+                name, extra = f"stage {row['stage']}", ""
+            logger.info("%s: %d calls, p50 %.3fs, p95 %.3fs, p99 %.3fs%s",
+                        name, row['count'], row['p50'], row['p95'], row['p99'], extra)
+
+    def write_jsonl(self, path):
+        """
+        Appends this run's summary rows to a JSON lines file.
+        """
+        finished_at = time.time()
+        with open(path, 'a') as jsonl_file:
+            for row in self.rows():
+                jsonl_file.write(json.dumps(dict(row, run_started_at=self.started_at, run_finished_at=finished_at)) + "\n")
+
+    def write_prometheus(self, path, prefix='fleet_sync'):
+        """
+        Writes this run's metrics in the Prometheus text format, replacing the file atomically
+        (for the node_exporter textfile collector).
+        """
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.extend([f"# HELP {prefix}_{name} {help_text}", f"# TYPE {prefix}_{name} {kind}"])
+
+        def labels(**values):
+            return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in values.items()) + '}'
+
+        rows = self.rows()
+        requests = [row for row in rows if row['kind'] == 'request']
+        stages = [row for row in rows if row['kind'] == 'stage']
+
+        metric('request_duration_seconds', 'summary', "Time on the wire per request, by endpoint.")
+        for row in requests:
+            endpoint = dict(api=row['api'], method=row['method'], endpoint=row['endpoint'])
+            for quantile in QUANTILES:
+                lines.append(f"{prefix}_request_duration_seconds"
+                             f"{labels(**endpoint, quantile=f'{quantile:g}')} {row[f'p{quantile * 100:g}']}")
+            lines.append(f"{prefix}_request_duration_seconds_sum{labels(**endpoint)} {row['sum']}")
+            lines.append(f"{prefix}_request_duration_seconds_count{labels(**endpoint)} {row['count']}")
+        metric('requests_total', 'counter', "Requests by endpoint and status code.")
+        for row in requests:
+            for status, count in sorted(row['statuses'].items()):
+                lines.append(f"{prefix}_requests_total"
+                             f"{labels(api=row['api'], method=row['method'], endpoint=row['endpoint'], status=status)} {count}")
+        for name, key, help_text in (
+            ('response_bytes_total', 'bytes', "Response body bytes by endpoint."),
+            ('request_retries_total', 'retries', "Retried attempts by endpoint."),
+            ('request_wait_seconds_total', 'wait', "Time spent rate limited or backing off, by endpoint."),
+        ):
+            metric(name, 'counter', help_text)
+            for row in requests:
+                lines.append(f"{prefix}_{name}"
+                             f"{labels(api=row['api'], method=row['method'], endpoint=row['endpoint'])} {row[key]}")
+
+        metric('stage_duration_seconds', 'summary', "Duration of each pipeline stage span.")
+        for row in stages:
+            for quantile in QUANTILES:
+                lines.append(f"{prefix}_stage_duration_seconds"
+                             f"{labels(stage=row['stage'], quantile=f'{quantile:g}')} {row[f'p{quantile * 100:g}']}")
+            lines.append(f"{prefix}_stage_duration_seconds_sum{labels(stage=row['stage'])} {row['sum']}")
+            lines.append(f"{prefix}_stage_duration_seconds_count{labels(stage=row['stage'])} {row['count']}")
+
+        metric('run_started_timestamp_seconds', 'gauge', "When the run these metrics cover started.")
+        lines.append(f"{prefix}_run_started_timestamp_seconds {self.started_at:.3f}")
+        metric('run_duration_seconds', 'gauge', "Duration of the run these metrics cover.")
+        lines.append(f"{prefix}_run_duration_seconds {time.time() - self.started_at:.3f}")
+
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.metrics.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as temp_file:
+                temp_file.write("\n".join(lines) + "\n")
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def export(self, jsonl_path=None, prometheus_path=None):
+        """
+        Logs the summary, writes whichever export files are configured, and starts a new run.
+        """
+        self.log_summary()
+        if jsonl_path:
+            self.write_jsonl(jsonl_path)
+        if prometheus_path:
+            self.write_prometheus(prometheus_path)
+        self.reset()
+
+
+def _round(value):
+    return None if value is None else round(value, 6)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
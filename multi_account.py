@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Syncs many Smartcar/Fleetio account pairs in parallel worker processes.
+
+    python multi_account.py accounts.json [--workers 8] [--results results.json]
+
+The manifest is a JSON list of accounts:
+
+    [
+        {"name": "acme", "credentials": "accounts/acme.env"},
+        {"name": "globex", "env": {"SMARTCAR_RATE_LIMIT": "2", "SYNC_MAX_WORKERS": "4"}}
+    ]
+
+Each account runs smart_fetch in its own process with its own settings.
+Its credentials file holds SMARTCAR_CLIENT_ID, SMARTCAR_CLIENT_SECRET,
+REDIRECT_URI, FLEETIO_API_TOKEN, FLEETIO_ACCOUNT_TOKEN and the rotating
+Smartcar tokens; it defaults to <ACCOUNTS_DIR>/<name>/.env. The account's
+sync state, outbox, log and request metrics (metrics.jsonl, metrics.prom)
+are kept next to it in <ACCOUNTS_DIR>/<name>/, so accounts never share
+tokens, rate limiters or state. Settings in "env" (rate limits,
+concurrency, paths, LOG_LEVEL) apply to that account only. Relative
+paths in the manifest are relative to the manifest file.
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from dotenv import dotenv_values
+
+from logging_config import configure_logging
+
+# Directory holding each account's credentials, state, outbox and log
+ACCOUNTS_DIR = os.getenv("ACCOUNTS_DIR", "accounts")
+# Accounts synced at once (default: one per CPU core)
+MULTI_ACCOUNT_WORKERS = int(os.getenv("MULTI_ACCOUNT_WORKERS", str(os.cpu_count() or 1)))
+
+# Settings that must come from the account itself, never from the parent
+# environment or the default .env
+ACCOUNT_KEYS = (
+    'SMARTCAR_CLIENT_ID', 'SMARTCAR_CLIENT_SECRET', 'REDIRECT_URI',
+    'FLEETIO_API_TOKEN', 'FLEETIO_ACCOUNT_TOKEN',
+    'SMARTCAR_ACCESS_TOKEN', 'SMARTCAR_REFRESH_TOKEN', 'SMARTCAR_TOKEN_EXPIRES_AT',
+    'SMARTCAR_ACCESS_TOKEN_SDK', 'SMARTCAR_REFRESH_TOKEN_SDK', 'SMARTCAR_TOKEN_EXPIRES_AT_SDK',
+)
+ACCOUNT_NAME = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.-]*$')
+
+
+def load_manifest(path, accounts_dir=ACCOUNTS_DIR):
+    """
+    Reads the manifest and returns its accounts with every path made absolute.
+
+    Raises ValueError for malformed entries and duplicate names.
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    accounts_dir = os.path.join(base, accounts_dir)
+    with open(path) as manifest_file:
+        entries = json.load(manifest_file)
+    if not isinstance(entries, list):
+        raise ValueError("The manifest must be a JSON list of accounts.")
+
+    accounts, names = [], set()
+    for number, entry in enumerate(entries, 1):
+        name = entry.get('name') if isinstance(entry, dict) else None
+        if not name or not ACCOUNT_NAME.match(name):
+            raise ValueError(f"Account {number} needs a name made of letters, digits, '.', '_' or '-'.")
+        if name in names:
+            raise ValueError(f"Account name '{name}' appears more than once.")
+        names.add(name)
+        directory = os.path.join(accounts_dir, name)
+        credentials = entry.get('credentials')
+        accounts.append({
+            'name': name,
+            'directory': directory,
+            'credentials': os.path.join(base, credentials) if credentials else os.path.join(directory, '.env'),
+            'env': {key: str(value) for key, value in (entry.get('env') or {}).items()},
+        })
+    return accounts
+
+
+def _account_environment(account):
+    """
+    Points this process's environment at one account's credentials and files.
+    """
+    for key in ACCOUNT_KEYS:
+        os.environ.pop(key, None)
+    values = dotenv_values(account['credentials']) if os.path.exists(account['credentials']) else {}
+    os.environ.update({key: value for key, value in values.items() if value is not None})
+    files = {
+        'SYNC_STATE_PATH': '.sync_state.db',
+        'FLEETIO_OUTBOX_PATH': '.fleetio_outbox.db',
+        'FLEETIO_INDEX_PATH': '.fleetio_vehicles.db',
+        'ODOMETER_STORE_PATH': '.odometer_store',
+        'METRICS_JSONL_PATH': 'metrics.jsonl',
+        'METRICS_PROMETHEUS_PATH': 'metrics.prom',
+    }
+    os.environ['CREDENTIALS_PATH'] = account['credentials']
+    for key, name in files.items():
+        # The SDK backend reads the _SDK variant; an account keeps one set of files either way
+        os.environ[key] = os.environ[key + '_SDK'] = os.path.join(account['directory'], name)
+    os.environ.update(account['env'])
+    # Present but empty, so smart_fetch's load_dotenv() cannot fill them from the default .env
+    for key in ACCOUNT_KEYS:
+        os.environ.setdefault(key, '')
+
+
+def sync_account(account):
+    """
+    Runs one sync of an account; meant to run in its own worker process.
+
+    Output goes to <directory>/sync.log. Returns a result dict with the
+    account name, status ('ok', 'incomplete' or 'failed'), elapsed seconds
+    and the sync summary or error.
+    """
+    os.makedirs(account['directory'], exist_ok=True)
+    log_path = os.path.join(account['directory'], 'sync.log')
+    result = {'name': account['name'], 'status': 'failed', 'seconds': 0.0, 'log': log_path}
+    started = time.monotonic()
+    with open(log_path, 'a') as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        print(f"--- Sync started at {time.strftime('%Y-%m-%d %H:%M:%S')}")
+        try:
+            _account_environment(account)
+            configure_logging(level=os.getenv("LOG_LEVEL", "INFO").upper(), stream=log)
+            import smart_fetch
+
+            summary = smart_fetch.main()
+            if summary is None:
+                result['error'] = "no Smartcar access token"
+            else:
+                result.update(summary)
+                result['status'] = 'ok' if summary['complete'] else 'incomplete'
+        except Exception as e:
+            traceback.print_exc()
+            result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = round(time.monotonic() - started, 2)
+    return result
+
+
+def _sync_in_fresh_process(account, context):
+    # A one-worker pool per account; unlike a long-lived pool it works before Python 3.11
+    # (max_tasks_per_child) and still reports a worker that died as BrokenProcessPool
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(sync_account, account).result()
+
+
+def sync_accounts(accounts, workers=MULTI_ACCOUNT_WORKERS):
+    """
+    Syncs every account, `workers` at a time, and returns their results.
+
+    Each account gets a fresh process, so module-level settings, clients
+    and tokens are never reused for another account.
+    """
+    results = []
+    context = multiprocessing.get_context('spawn')
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_sync_in_fresh_process, account, context): account for account in accounts}
+        for future in as_completed(futures):
+            account = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process itself died
+                result = {'name': account['name'], 'status': 'failed', 'seconds': 0.0,
+                          'error': f"{type(e).__name__}: {e}"}
+            print(f"Account '{result['name']}': {result['status']} in {result['seconds']:.1f}s"
+                  + (f" ({result['error']})" if result.get('error') else
+                     f", {result['polled']} of {result['listed']} vehicles polled, "
+                     f"{result['sent']} Fleetio writes sent, {result['failed']} failed"))
+            results.append(result)
+    return sorted(results, key=lambda result: result['name'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('manifest', help="JSON list of accounts")
+    parser.add_argument('--workers', type=int, default=MULTI_ACCOUNT_WORKERS,
+                        help="accounts synced at once")
+    parser.add_argument('--results', help="write the per-account results to this JSON file")
+    args = parser.parse_args()
+
+    try:
+        accounts = load_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        print(f"Invalid manifest {args.manifest}: {e}")
+        return 2
+
+    started = time.monotonic()
+    results = sync_accounts(accounts, max(1, min(args.workers, len(accounts))))
+    failed = [result['name'] for result in results if result['status'] != 'ok']
+    print(f"Synced {len(results) - len(failed)} of {len(results)} accounts in {time.monotonic() - started:.1f}s.")
+    if failed:
+        print(f"Accounts needing attention: {', '.join(failed)}")
+    if args.results:
+        with open(args.results, 'w') as results_file:
+            json.dump(results, results_file, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Local odometer history: every reading the sync saw, with a vectorized sanity check.
+
+    python odometer_store.py daily [--days 30] [--csv daily.csv]
+    python odometer_store.py audit [--max-speed 200]
+
+Needs NumPy. The store is a directory (ODOMETER_STORE_PATH) holding:
+
+- readings.bin: an append-only log of fixed-size records (vehicle index,
+  time, miles, status), one per reading, rejected ones included;
+- vehicles.txt: Smartcar vehicle IDs in index order, also append-only;
+- daily.npy, last.npy: the highest accepted reading per vehicle per UTC
+  day, and each vehicle's last accepted reading. Both are rebuilt from
+  the log's tail if the process died before saving them (meta.json says
+  how much of the log they cover).
+
+Fleet-wide questions (miles per vehicle per day) are answered from the
+daily matrix without reading the log or calling any API.
+
+Several processes (a sync daemon and the webhook receiver, say) may share
+one store: every operation holds an exclusive lock on store.lock and
+first reads what the others appended since.
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are serialized
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ODOMETER_STORE_PATH = os.getenv("ODOMETER_STORE_PATH", ".odometer_store")
+# Readings implying a faster average speed since the last accepted one are rejected
+ODOMETER_MAX_SPEED = float(os.getenv("ODOMETER_MAX_SPEED", "200"))
+
+READING = np.dtype([('vehicle', '<u4'), ('time', '<f8'), ('miles', '<f8'), ('status', 'u1')])
+ACCEPTED, ZERO, NEGATIVE, TOO_FAST = 0, 1, 2, 3
+STATUS_NAMES = {ACCEPTED: 'accepted', ZERO: 'zero or negative reading',
+                NEGATIVE: 'lower than the last reading', TOO_FAST: 'impossible speed'}
+DAY = 86400
+
+
+def check_readings(times, miles, last_times, last_miles, max_speed=ODOMETER_MAX_SPEED):
+    """
+    Vectorized sanity check of readings against each vehicle's last accepted reading.
+
+    All arguments are equal-length arrays; last_times/last_miles are NaN
+    for vehicles with no earlier reading. Returns a status code per
+    reading: ACCEPTED, ZERO (at or below 0 miles), NEGATIVE (below the
+    last reading) or TOO_FAST (more than max_speed mph on average since
+    the last reading).
+    """
+    times, miles = np.asarray(times, dtype=float), np.asarray(miles, dtype=float)
+    delta = miles - np.asarray(last_miles, dtype=float)
+    hours = (times - np.asarray(last_times, dtype=float)) / 3600
+    with np.errstate(divide='ignore', invalid='ignore'):
+        speed = np.where(delta > 0, delta / np.maximum(hours, 0), 0.0)
+    status = np.full(len(miles), ACCEPTED, dtype=np.uint8)
+    status[speed > max_speed] = TOO_FAST
+    status[delta < 0] = NEGATIVE
+    status[~(miles > 0)] = ZERO
+    return status
+
+
+class OdometerStore:
+    """
+    Append-only columnar store of odometer readings with a daily rollup per vehicle.
+
+    record() checks and appends one reading; check_batch() runs the same
+    check over many vehicles at once. Safe to share between worker threads
+    and between processes.
+    """
+
+    def __init__(self, path, max_speed=ODOMETER_MAX_SPEED):
+        self.path = path
+        self.max_speed = max_speed
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self._log_path = os.path.join(path, 'readings.bin')
+        self._vehicles_path = os.path.join(path, 'vehicles.txt')
+        self._lock_file = open(os.path.join(path, 'store.lock'), 'a')
+        self.vehicle_ids = []
+        self._index = {}
+        self._vehicles_read = 0
+        with self._locked():
+            meta = self._read_json('meta.json') or {}
+            self.rows = meta.get('rows', 0)
+            self.first_day = meta.get('first_day') if self.rows else None
+            self.daily = self._load('daily.npy', (0, 0)) if self.rows else np.full((0, 0), np.nan)
+            self.last = self._load('last.npy', (0, 2)) if self.rows else np.full((0, 2), np.nan)
+            # Readings appended after the arrays were last saved (by a process that died, or another one)
+            self._catch_up()
+            self._log = open(self._log_path, 'ab')
+            self._vehicles = open(self._vehicles_path, 'a')
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _catch_up(self):
+        """
+        Reads the vehicles and readings other processes appended since this one last looked.
+
+        Called with the lock held, so anything partly written was left by a crash.
+        """
+        if os.path.exists(self._vehicles_path):
+            with open(self._vehicles_path, 'rb+') as vehicles_file:
+                vehicles_file.seek(self._vehicles_read)
+                data = vehicles_file.read()
+                complete = data.rfind(b'\n') + 1
+                if complete < len(data):
+                    # Drop a line cut short by a crash, so appends start on a fresh line
+                    vehicles_file.truncate(self._vehicles_read + complete)
+            for vehicle_id in data[:complete].decode().splitlines():
+                self._index[vehicle_id] = len(self.vehicle_ids)
+                self.vehicle_ids.append(vehicle_id)
+            self._vehicles_read += complete
+            self._grow(len(self.vehicle_ids))
+        if os.path.exists(self._log_path):
+            # Likewise a partly written record, so later records stay aligned
+            size = os.path.getsize(self._log_path)
+            if size % READING.itemsize:
+                os.truncate(self._log_path, size - size % READING.itemsize)
+        tail = self._read_log(self.rows)
+        for reading in tail:
+            if reading['status'] == ACCEPTED:
+                self._roll_up(reading['vehicle'], reading['time'], reading['miles'])
+        self.rows += len(tail)
+
+    def _read_json(self, name):
+        try:
+            with open(os.path.join(self.path, name)) as meta_file:
+                return json.load(meta_file)
+        except FileNotFoundError:
+            return None
+
+    def _load(self, name, shape):
+        try:
+            return np.load(os.path.join(self.path, name))
+        except FileNotFoundError:
+            return np.full(shape, np.nan)
+
+    def _read_log(self, start=0):
+        if not os.path.exists(self._log_path):
+            return np.empty(0, dtype=READING)
+        count = os.path.getsize(self._log_path) // READING.itemsize
+        if count <= start:
+            return np.empty(0, dtype=READING)
+        log = np.memmap(self._log_path, dtype=READING, mode='r', shape=(count,))
+        return np.array(log[start:])
+
+    def _grow(self, vehicles, day=None):
+        """
+        Makes room in the arrays for `vehicles` vehicles and for `day` (a day number).
+        """
+        if vehicles > len(self.last):
+            extra = vehicles - len(self.last)
+            self.last = np.vstack([self.last, np.full((extra, 2), np.nan)])
+            self.daily = np.vstack([self.daily, np.full((extra, self.daily.shape[1]), np.nan)])
+        if day is None:
+            return
+        if self.first_day is None:
+            self.first_day = day
+        if day < self.first_day:
+            self.daily = np.hstack([np.full((len(self.daily), self.first_day - day), np.nan), self.daily])
+            self.first_day = day
+        if day - self.first_day >= self.daily.shape[1]:
+            extra = day - self.first_day + 1 - self.daily.shape[1]
+            # Grow by at least a month so appends do not copy the matrix every day
+            self.daily = np.hstack([self.daily, np.full((len(self.daily), max(extra, 31)), np.nan)])
+
+    def _roll_up(self, vehicle, at, miles):
+        day = int(at // DAY)
+        self._grow(vehicle + 1, day)
+        column = day - self.first_day
+        self.daily[vehicle, column] = np.fmax(self.daily[vehicle, column], miles)
+        if not at < self.last[vehicle, 0]:
+            self.last[vehicle] = (at, miles)
+
+    def _vehicle_index(self, vehicle_id):
+        index = self._index.get(vehicle_id)
+        if index is None:
+            index = self._index[vehicle_id] = len(self.vehicle_ids)
+            self.vehicle_ids.append(vehicle_id)
+            # Written before any reading refers to the index
+            self._vehicles.write(vehicle_id + "\n")
+            self._vehicles.flush()
+            self._vehicles_read += len(vehicle_id.encode()) + 1
+            self._grow(index + 1)
+        return index
+
+    def check_batch(self, vehicle_ids, times, miles):
+        """
+        Checks readings for many vehicles in one vectorized pass without recording them.
+
+        Returns a status code per reading (see check_readings).
+        """
+        with self._locked():
+            self._catch_up()
+            indexes = np.array([self._index.get(vehicle_id, -1) for vehicle_id in vehicle_ids], dtype=int)
+            last = np.full((len(indexes), 2), np.nan)
+            known = indexes >= 0
+            last[known] = self.last[indexes[known]]
+        return check_readings(times, miles, last[:, 0], last[:, 1], self.max_speed)
+
+    def record(self, vehicle_id, miles, at=None):
+        """
+        Checks one reading and appends it to the log, rejected or not.
+
+        Returns None when the reading was accepted, else the reason it was rejected.
+        """
+        at = time.time() if at is None else at
+        with self._locked():
+            self._catch_up()
+            vehicle = self._vehicle_index(vehicle_id)
+            last_at, last_miles = self.last[vehicle]
+            status = int(check_readings([at], [miles], [last_at], [last_miles], self.max_speed)[0])
+            self._log.write(np.array([(vehicle, at, miles, status)], dtype=READING).tobytes())
+            self._log.flush()
+            self.rows += 1
+            if status == ACCEPTED:
+                self._roll_up(vehicle, at, miles)
+        return None if status == ACCEPTED else STATUS_NAMES[status]
+
+    def daily_odometer(self, start=None, end=None):
+        """
+        Returns (vehicle_ids, days, odometer): the latest accepted reading at the end of each
+        UTC day between start and end (datetime64 days or ISO dates, inclusive), carried
+        forward over days without one (NaN before a vehicle's first reading).
+        """
+        with self._locked():
+            self._catch_up()
+            vehicle_ids, first_day = list(self.vehicle_ids), self.first_day
+            if first_day is None:
+                return vehicle_ids, np.empty(0, dtype='datetime64[D]'), np.full((len(vehicle_ids), 0), np.nan)
+            daily = self.daily[:len(vehicle_ids)]
+            # The matrix is grown ahead of time; stop at the newest reading's day
+            last_day = int(np.nanmax(self.last[:, 0]) // DAY)
+            first = 0 if start is None else min(max(_day_number(start) - first_day, 0), last_day - first_day + 1)
+            stop = last_day - first_day + 1 if end is None else min(_day_number(end), last_day) - first_day + 1
+            stop = max(stop, first)
+            # Only the requested days are accumulated, starting from the highest reading before them
+            odometer = np.fmax.accumulate(daily[:, first:stop], axis=1) if stop > first else daily[:, :0].copy()
+            if first and odometer.size:
+                np.fmax(odometer, np.fmax.reduce(daily[:, :first], axis=1)[:, None], out=odometer)
+        days = np.arange(first_day + first, first_day + stop).astype('datetime64[D]')
+        return vehicle_ids, days, odometer
+
+    def daily_miles(self, start=None, end=None):
+        """
+        Returns (vehicle_ids, days, miles) with the miles each vehicle drove on each UTC day
+        between start and end (datetime64 days or ISO dates, inclusive).
+
+        Distance driven across days without readings is counted on the day of the next reading.
+        """
+        # One day earlier, so the first day's miles have a reading to start from
+        before = None if start is None else np.datetime64(start, 'D') - 1
+        vehicle_ids, days, odometer = self.daily_odometer(before, end)
+        if before is not None and len(days) and days[0] == before:
+            miles = odometer[:, 1:] - odometer[:, :-1]
+            days = days[1:]
+        else:
+            miles = np.diff(odometer, axis=1, prepend=np.nan)
+        np.nan_to_num(miles, copy=False, nan=0.0)
+        return vehicle_ids, days, miles
+
+    def readings(self, vehicle_id=None):
+        """
+        Returns the logged readings, of one vehicle or of all, as a structured array.
+        """
+        with self._locked():
+            self._catch_up()
+            index = self._index.get(vehicle_id)
+            log = self._read_log()
+        if vehicle_id is None:
+            return log
+        if index is None:
+            return log[:0]
+        return log[log['vehicle'] == index]
+
+    def save(self):
+        """
+        Writes the daily and last-reading arrays so the next open does not replay the log.
+        """
+        with self._locked():
+            self._catch_up()
+            self._save('daily.npy', self.daily)
+            self._save('last.npy', self.last)
+            self._save('meta.json', {'first_day': self.first_day, 'rows': self.rows})
+
+    def _save(self, name, value):
+        fd, temp_path = tempfile.mkstemp(dir=self.path, prefix=f'.{name}.', suffix='.tmp')
+        with os.fdopen(fd, 'wb' if name.endswith('.npy') else 'w') as temp_file:
+            if name.endswith('.npy'):
+                np.save(temp_file, value)
+            else:
+                json.dump(value, temp_file)
+        os.replace(temp_path, os.path.join(self.path, name))
+
+    def close(self):
+        self.save()
+        with self._lock:
+            self._log.close()
+            self._vehicles.close()
+            self._lock_file.close()
+
+
+def _day_number(day):
+    return int(np.datetime64(day, 'D').astype(int))
+
+
+def audit(log, max_speed=ODOMETER_MAX_SPEED):
+    """
+    Re-checks every accepted reading in a log against the one before it, in one vectorized pass.
+
+    Returns a status code per accepted reading, in (vehicle, time) order, so
+    a changed max_speed can be tried on the whole history.
+    """
+    accepted = log[log['status'] == ACCEPTED]
+    accepted = accepted[np.lexsort((accepted['time'], accepted['vehicle']))]
+    same_vehicle = np.r_[False, accepted['vehicle'][1:] == accepted['vehicle'][:-1]]
+    last_times = np.where(same_vehicle, np.r_[np.nan, accepted['time'][:-1]], np.nan)
+    last_miles = np.where(same_vehicle, np.r_[np.nan, accepted['miles'][:-1]], np.nan)
+    return check_readings(accepted['time'], accepted['miles'], last_times, last_miles, max_speed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--path', default=ODOMETER_STORE_PATH)
+    commands = parser.add_subparsers(dest='command', required=True)
+    daily_parser = commands.add_parser('daily', help="miles per vehicle per day")
+    daily_parser.add_argument('--days', type=int, default=30)
+    daily_parser.add_argument('--csv', help="write vehicle x day miles to this CSV file")
+    audit_parser = commands.add_parser('audit', help="count rejected readings and re-check accepted ones")
+    audit_parser.add_argument('--max-speed', type=float, default=ODOMETER_MAX_SPEED)
+    args = parser.parse_args()
+
+    store = OdometerStore(args.path)
+    try:
+        started = time.perf_counter()
+        if args.command == 'daily':
+            end = np.datetime64('today', 'D')
+            vehicle_ids, days, miles = store.daily_miles(end - args.days + 1, end)
+            elapsed = time.perf_counter() - started
+            totals = miles.sum(axis=1)
+            print(f"{len(vehicle_ids)} vehicles, {len(days)} days, {totals.sum():.0f} miles "
+                  f"({elapsed * 1000:.1f} ms)")
+            for vehicle_id, total in sorted(zip(vehicle_ids, totals), key=lambda item: -item[1])[:20]:
+                print(f"{vehicle_id:>40} {total:>10.1f} mi {total / max(1, len(days)):>8.1f} mi/day")
+            if args.csv:
+                with open(args.csv, 'w') as csv_file:
+                    csv_file.write(','.join(['vehicle_id'] + [str(day) for day in days]) + "\n")
+                    for vehicle_id, row in zip(vehicle_ids, miles):
+                        csv_file.write(','.join([vehicle_id] + [f"{value:.2f}" for value in row]) + "\n")
+        else:
+            log = store.readings()
+            statuses = audit(log, args.max_speed)
+            elapsed = time.perf_counter() - started
+            print(f"{len(log)} readings of {len(store.vehicle_ids)} vehicles ({elapsed * 1000:.1f} ms)")
+            for status, name in STATUS_NAMES.items():
+                print(f"{name:>30}: {int((log['status'] == status).sum())} logged, "
+                      f"{int((statuses == status).sum())} of the accepted on re-check")
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Onboards a newly connected Smartcar fleet into Fleetio in bulk.
+
+    python onboard.py [--workers 16] [--checkpoint .onboarding.jsonl] [--dry-run]
+
+Lists every Smartcar vehicle and loads the whole Fleetio vehicle list once,
+then diffs the two: vehicles already in the state store or the checkpoint
+are skipped, the rest are fetched from Smartcar concurrently and matched to
+a Fleetio vehicle by VIN, or created when there is none. Creations run on
+up to FLEETIO_MAX_CONCURRENCY threads, paced by the Fleetio rate limiter,
+instead of one search and one POST per vehicle in turn.
+
+Each finished vehicle is appended to the checkpoint file, so an interrupted
+onboarding picks up where it stopped when run again. Vehicles that failed
+are not checkpointed and are retried. --dry-run fetches and diffs without
+writing to Fleetio and reports what would be created and matched.
+Afterwards the regular sync treats every onboarded vehicle as known.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+import smart_fetch
+from logging_config import configure_logging
+from outbox import OutboxDrainer
+from pipeline import run_pipeline
+from smartcar_backends import SmartcarError
+
+logger = logging.getLogger(__name__)
+
+# Vehicles already onboarded, one JSON object per line
+ONBOARD_CHECKPOINT_PATH = os.getenv("ONBOARD_CHECKPOINT_PATH", ".onboarding.jsonl")
+# Vehicles fetched from Smartcar at once
+ONBOARD_WORKERS = int(os.getenv("ONBOARD_WORKERS", "16"))
+# Progress is logged every this many vehicles
+ONBOARD_PROGRESS_EVERY = 100
+
+
+class OnboardingCheckpoint:
+    """
+    Append-only record of onboarded Smartcar vehicles.
+
+    Every line is flushed as it is written, so at most the vehicle being
+    written when the process died is lost; a truncated last line is ignored
+    on load.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as checkpoint_file:
+                for line in checkpoint_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.done[entry['vehicle_id']] = entry
+        self._file = open(path, 'a')
+
+    def record(self, vehicle_id, vin, fleetio_id, action):
+        entry = {'vehicle_id': vehicle_id, 'vin': vin, 'fleetio_id': fleetio_id,
+                 'action': action, 'at': time.time()}
+        with self._lock:
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+            self.done[vehicle_id] = entry
+
+    def close(self):
+        self._file.close()
+
+
+def plan(vehicle_ids, checkpoint):
+    """
+    Splits the Smartcar fleet into vehicles still to onboard and counts of those already done.
+    """
+    pending, counts = [], {'checkpointed': 0, 'known': 0}
+    for vehicle_id in vehicle_ids:
+        if vehicle_id in checkpoint.done:
+            counts['checkpointed'] += 1
+            continue
+        state = smart_fetch.state_store.get(vehicle_id) if smart_fetch.state_store is not None else None
+        if state and state['fleetio_id']:
+            counts['known'] += 1
+            continue
+        pending.append(vehicle_id)
+    return pending, counts
+
+
+def onboard(access_token, vehicle_ids, checkpoint, workers=ONBOARD_WORKERS, dry_run=False):
+    """
+    Fetches, diffs and writes the given vehicles; returns counts of vehicles created, matched and failed.
+    """
+    index = smart_fetch.prefetch_fleetio_index()
+    if index is None:
+        logger.warning("Without the Fleetio vehicle list every vehicle needs its own VIN search.")
+    counts = {'created': 0, 'matched': 0, 'failed': 0}
+    lock = threading.Lock()
+
+    def count(key):
+        with lock:
+            counts[key] += 1
+            done = sum(counts.values())
+        if done % ONBOARD_PROGRESS_EVERY == 0:
+            logger.info("Onboarded %d of %d vehicles (%d created, %d matched, %d failed).",
+                        done, len(vehicle_ids), counts['created'], counts['matched'], counts['failed'])
+
+    def fetch(vehicle_id):
+        with smart_fetch.metrics.stage('fetch'):
+            attributes, mileage = smart_fetch.fetch_vehicle(access_token, vehicle_id)
+        if attributes is None or not attributes['vin']:
+            count('failed')
+            return None
+        return vehicle_id, attributes, mileage
+
+    def write(fetched):
+        vehicle_id, attributes, mileage = fetched
+        found = index is not None and index.find_by_vin(attributes['vin']) is not None
+        action = 'matched' if found else 'created'
+        if dry_run:
+            count(action)
+            return
+        with smart_fetch.metrics.stage('write'):
+            fleetio_id = smart_fetch.write_vehicle(vehicle_id, attributes, mileage)
+        if fleetio_id is None:
+            count('failed')
+            return
+        checkpoint.record(vehicle_id, attributes['vin'], fleetio_id, action)
+        count(action)
+
+    def report_error(item, error):
+        vehicle_id = item[0] if isinstance(item, tuple) else item
+        logger.error("Error onboarding vehicle ID %s: %s", vehicle_id, error)
+        count('failed')
+
+    run_pipeline(
+        vehicle_ids,
+        [(fetch, workers), (write, min(workers, smart_fetch.FLEETIO_MAX_CONCURRENCY))],
+        queue_size=smart_fetch.SYNC_QUEUE_SIZE,
+        on_error=report_error
+    )
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=ONBOARD_WORKERS, help="vehicles fetched from Smartcar at once")
+    parser.add_argument('--checkpoint', default=ONBOARD_CHECKPOINT_PATH, help="JSON lines file of onboarded vehicles")
+    parser.add_argument('--dry-run', action='store_true', help="report what would be created without writing")
+    args = parser.parse_args()
+    configure_logging()
+
+    access_token = smart_fetch.get_smartcar_access_token()
+    if not access_token:
+        return 1
+    try:
+        vehicle_ids = list(smart_fetch.iter_vehicle_ids(access_token))
+    except SmartcarError as e:
+        logger.error("Failed to fetch vehicles from Smartcar: %s", e)
+        return 1
+
+    started = time.monotonic()
+    smart_fetch.open_sync_resources()
+    checkpoint = OnboardingCheckpoint(args.checkpoint)
+    drainer = None
+    if smart_fetch.outbox is not None and not args.dry_run:
+        drainer = OutboxDrainer(smart_fetch.outbox, smart_fetch.fleetio_client, smart_fetch.FLEETIO_MAX_CONCURRENCY).start()
+    try:
+        pending, skipped = plan(vehicle_ids, checkpoint)
+        logger.info("%d Smartcar vehicles: %d already onboarded, %d already synced, %d to onboard.",
+                    len(vehicle_ids), skipped['checkpointed'], skipped['known'], len(pending))
+        counts = onboard(access_token, pending, checkpoint, max(1, args.workers), args.dry_run)
+    finally:
+        if drainer is not None:
+            smart_fetch._report_outbox(*drainer.stop())
+        checkpoint.close()
+        smart_fetch.export_metrics()
+        smart_fetch.close_sync_resources()
+
+    logger.info("%s in %.1fs: %d vehicles %s, %d matched by VIN, %d failed.",
+                "Dry run finished" if args.dry_run else "Onboarding finished", time.monotonic() - started,
+                counts['created'], "to create" if args.dry_run else "created", counts['matched'], counts['failed'])
+    if counts['failed'] and not args.dry_run:
+        logger.warning("Run onboard.py again to retry the vehicles that failed.")
+    return 1 if counts['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Responses that mean "try again later" rather than "this write is wrong"
+RETRYABLE_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+
+class FleetioOutbox:
+    """
+    Durable local queue of Fleetio writes (method, path, JSON payload).
+
+    Writes are recorded in SQLite before they are sent, so a failed or
+    interrupted send is retried on a later drain instead of being lost.
+    Retryable failures back off exponentially with jitter; a write that keeps
+    failing, or that Fleetio rejects outright (4xx), is kept as 'dead' for
+    inspection. Delivery is at-least-once. Safe to share between threads and
+    between processes: a drain claims the writes it sends by leasing them
+    for `lease` seconds, so another drainer on the same file skips them. A
+    lease left by a process that died expires and the write is sent again.
+
+    Writes enqueued with a coalesce key and a delay are held for that long;
+    a later write with the same key replaces the held one's payload, so only
+    the latest is sent.
+
+    on_dead(entry, status) is called for every write marked dead, with the
+    HTTP status of the last attempt (None after a connection error), so the
+    caller can react to a write that will never succeed.
+    """
+
+    def __init__(self, path, max_attempts=10, backoff_base=30.0, backoff_cap=6 * 3600.0, lease=300.0,
+                 on_dead=None):
+        self.path = path
+        self.on_dead = on_dead
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._drain_lock = threading.Lock()
+        self.coalesced = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    method TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    last_error TEXT,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    coalesce_key TEXT
+                )
+                """
+            )
+            columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(outbox)")}
+            if 'coalesce_key' not in columns:
+                self._conn.execute("ALTER TABLE outbox ADD COLUMN coalesce_key TEXT")
+            if 'leased_until' not in columns:
+                self._conn.execute("ALTER TABLE outbox ADD COLUMN leased_until REAL")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS outbox_coalesce ON outbox (coalesce_key)"
+            )
+
+    def enqueue(self, method, path, payload, coalesce_key=None, delay=0):
+        """
+        Records a write to send later and returns its outbox ID.
+
+        With a coalesce_key, a write with the same key that is still being
+        held (not yet due, attempted or claimed) gets this payload instead, and
+        its ID is returned. The write is held for `delay` seconds before it is due.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            if coalesce_key is not None:
+                held = self._conn.execute(
+                    "SELECT id FROM outbox WHERE coalesce_key = ? AND status = 'pending' AND attempts = 0 "
+                    "AND next_attempt_at > ? AND (leased_until IS NULL OR leased_until <= ?) "
+                    "ORDER BY id DESC LIMIT 1",
+                    (coalesce_key, now, now)
+                ).fetchone()
+                if held:
+                    self._conn.execute(
+                        "UPDATE outbox SET payload = ? WHERE id = ?", (json.dumps(payload), held['id'])
+                    )
+                    self.coalesced += 1
+                    return held['id']
+            cursor = self._conn.execute(
+                "INSERT INTO outbox (method, path, payload, created_at, next_attempt_at, coalesce_key) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (method, path, json.dumps(payload), now, now + delay, coalesce_key)
+            )
+            return cursor.lastrowid
+
+    def counts(self):
+        """
+        Returns {'pending': n, 'dead': n}.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        counts = {'pending': 0, 'dead': 0}
+        counts.update({status: count for status, count in rows})
+        return counts
+
+    def due(self, limit=500, flush=False):
+        """
+        Returns up to `limit` pending writes whose next attempt time has passed, oldest first.
+
+        With flush, writes still being held for coalescing count as due too.
+        Writes another drain has claimed are left out.
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM outbox WHERE status = 'pending' "
+                "AND (next_attempt_at <= ? OR (? AND attempts = 0)) "
+                "AND (leased_until IS NULL OR leased_until <= ?) ORDER BY id LIMIT ?",
+                (now, flush, now, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def claim(self, limit=500, flush=False):
+        """
+        Like due(), but leases the returned writes so no other drain, in this
+        process or another, sends them until they are marked sent or failed.
+        """
+        with self._lock:
+            # The write lock is taken up front, so two processes cannot claim the same rows
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                rows = self._conn.execute(
+                    "SELECT * FROM outbox WHERE status = 'pending' "
+                    "AND (next_attempt_at <= ? OR (? AND attempts = 0)) "
+                    "AND (leased_until IS NULL OR leased_until <= ?) ORDER BY id LIMIT ?",
+                    (now, flush, now, limit)
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE outbox SET leased_until = ? WHERE id = ?", [(now + self.lease, row['id']) for row in rows]
+                )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return [dict(row) for row in rows]
+
+    def _mark_sent(self, entry_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM outbox WHERE id = ?", (entry_id,))
+
+    def _mark_failed(self, entry, error, permanent=False, status=None):
+        attempts = entry['attempts'] + 1
+        dead = permanent or attempts >= self.max_attempts
+        delay = random.uniform(0.5, 1.0) * min(self.backoff_cap, self.backoff_base * 2 ** (attempts - 1))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ?, status = ?, leased_until = NULL "
+                "WHERE id = ?",
+                (attempts, time.time() + delay, error, 'dead' if dead else 'pending', entry['id'])
+            )
+        if dead and self.on_dead is not None:
+            try:
+                self.on_dead(entry, status)
+            except Exception:
+                logger.exception("Error handling dead Fleetio write (outbox ID %s)", entry['id'])
+        return dead
+
+    def _send(self, fleetio_client, entry):
+        """
+        Sends one write. Returns True if it was delivered.
+        """
+        try:
+            response = fleetio_client.request(entry['method'], entry['path'], json=json.loads(entry['payload']))
+        except (requests.ConnectionError, requests.Timeout) as e:
+            self._mark_failed(entry, str(e))
+            return False
+        if response.ok:
+            self._mark_sent(entry['id'])
+            return True
+        permanent = response.status_code not in RETRYABLE_STATUS_CODES
+        if self._mark_failed(entry, f"{response.status_code} - {response.text}", permanent, response.status_code):
+            logger.error("Giving up on Fleetio %s %s (outbox ID %s): %s - %s",
+                         entry['method'], entry['path'], entry['id'], response.status_code, response.text)
+        return False
+
+    def drain(self, fleetio_client, max_workers=4, batch_size=500, flush=False):
+        """
+        Sends every due write, max_workers at a time, until none are due.
+
+        Throughput is bounded only by the client's rate limiter and
+        concurrency cap. flush also sends writes held for coalescing.
+        Returns (sent, failed).
+        """
+        sent = failed = 0
+        with self._drain_lock, ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                entries = self.claim(batch_size, flush)
+                if not entries:
+                    break
+                results = list(executor.map(lambda entry: self._send(fleetio_client, entry), entries))
+                sent += sum(results)
+                failed += len(results) - sum(results)
+                if not any(results):
+                    # Everything in this batch failed; leave the rest for the next drain
+                    break
+        return sent, failed
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class OutboxDrainer:
+    """
+    Drains an outbox on a background thread while the sync keeps fetching.
+
+    stop() ends the loop and performs a final drain, flushing writes held
+    for coalescing, and returns the totals.
+    """
+
+    def __init__(self, outbox, fleetio_client, max_workers=4, interval=0.5):
+        self.outbox = outbox
+        self.fleetio_client = fleetio_client
+        self.max_workers = max_workers
+        self.interval = interval
+        self.sent = self.failed = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _drain(self, flush=False):
+        sent, failed = self.outbox.drain(self.fleetio_client, self.max_workers, flush=flush)
+        self.sent += sent
+        self.failed += failed
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._drain()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._drain(flush=True)
+        return self.sent, self.failed
+
+
+def open_outbox(path, on_dead=None):
+    """
+    Opens the outbox at path, or returns None when path is empty (outbox disabled).
+    """
+    if not path:
+        return None
+    return FleetioOutbox(path, on_dead=on_dead)
@@ -0,0 +1,63 @@
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+def _report_error(item, error):
+    logger.error("Error processing %r: %s", item, error)
+
+
+def run_pipeline(source, stages, queue_size=100, on_error=_report_error):
+    """
+    Streams items from `source` through `stages` connected by bounded queues.
+
+    Each stage is a (func, workers) pair: `workers` threads call func(item)
+    and pass the result to the next stage, or drop the item when it returns
+    None. Items flow as soon as the source yields them, and a full queue
+    blocks the stage feeding it, so memory stays bounded by queue_size per
+    stage whatever the size of the source. An exception from func is passed
+    to on_error(item, exc) and the item is dropped; an exception from the
+    source stops the feed, lets queued items finish and is then re-raised.
+
+    Returns the number of items taken from the source.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    outputs = queues[1:] + [None]
+    workers = []
+
+    def work(func, inbox, outbox):
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                return
+            try:
+                result = func(item)
+            except Exception as e:
+                on_error(item, e)
+                continue
+            if result is not None and outbox is not None:
+                outbox.put(result)
+
+    for (func, count), inbox, outbox in zip(stages, queues, outputs):
+        threads = [threading.Thread(target=work, args=(func, inbox, outbox), daemon=True) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        workers.append(threads)
+
+    fed = 0
+    try:
+        for item in source:
+            queues[0].put(item)
+            fed += 1
+    finally:
+        # Shut the stages down in order, so each one sees every item from the one before
+        for inbox, threads in zip(queues, workers):
+            for _ in threads:
+                inbox.put(_DONE)
+            for thread in threads:
+                thread.join()
+    return fed
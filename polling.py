@@ -0,0 +1,75 @@
+import time
+
+# Weight of the newest odometer-rate sample in the moving average
+RATE_SMOOTHING = 0.5
+
+
+def odometer_rate(state, mileage, now=None, smoothing=RATE_SMOOTHING):
+    """
+    Returns a vehicle's odometer rate in miles per hour after a new reading.
+
+    The rate is an exponential moving average of the deltas between
+    readings, so one long trip does not pin a vehicle to fast polling.
+    Returns the previous rate (or None) when there is no earlier reading to
+    compare with. Readings that go backwards count as no movement.
+    """
+    now = time.time() if now is None else now
+    previous, previous_at = state.get('last_odometer'), state.get('last_odometer_at')
+    if previous is None or not previous_at or now <= previous_at:
+        return state.get('odometer_rate')
+    sample = max(0.0, mileage - previous) / ((now - previous_at) / 3600)
+    rate = state.get('odometer_rate')
+    return sample if rate is None else smoothing * sample + (1 - smoothing) * rate
+
+
+class AdaptivePollSchedule:
+    """
+    Decides when each vehicle's odometer is next worth polling.
+
+    A vehicle is polled about every `target_miles` of driving at its recent
+    rate, between min_interval and max_interval seconds: busy vehicles
+    often, parked ones rarely. Vehicles with no rate yet use min_interval so
+    it is learned quickly. When the resulting polls per hour across the
+    fleet exceed budget_per_hour (0 = no budget), rebalance() stretches every
+    interval by the same factor so the fleet stays within it.
+    """
+
+    def __init__(self, min_interval=900, max_interval=86400, target_miles=10, budget_per_hour=0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_miles = target_miles
+        self.budget_per_hour = budget_per_hour
+        self.scale = 1.0
+
+    def base_interval(self, rate):
+        if rate is None:
+            return self.min_interval
+        if rate <= 0:
+            return self.max_interval
+        return min(self.max_interval, max(self.min_interval, 3600 * self.target_miles / rate))
+
+    def interval(self, rate):
+        """
+        Seconds between polls for a vehicle driving `rate` miles per hour, within the budget.
+        """
+        return self.base_interval(rate) * self.scale
+
+    def rebalance(self, rates):
+        """
+        Recomputes the budget scale factor from every vehicle's current rate.
+        """
+        demand = sum(3600 / self.base_interval(rate) for rate in rates)
+        if self.budget_per_hour and demand > self.budget_per_hour:
+            self.scale = demand / self.budget_per_hour
+        else:
+            self.scale = 1.0
+        return self.scale
+
+    def is_due(self, state, now=None):
+        """
+        True when the vehicle's last odometer reading is older than its interval (or it has none).
+        """
+        if not state or not state.get('last_odometer_at'):
+            return True
+        now = time.time() if now is None else now
+        return now - state['last_odometer_at'] >= self.interval(state.get('odometer_rate'))
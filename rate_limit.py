@@ -0,0 +1,208 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+
+# Transient upstream failures, retried for idempotent requests (429 is handled separately)
+TRANSIENT_STATUS_CODES = (502, 503, 504)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: refills at `rate` tokens per second up to `capacity`.
+
+    acquire() blocks until a token is available, so callers are paced at the
+    sustained rate with bursts of at most `capacity`. pause_until() empties
+    the bucket until a given time, making every caller wait out a rate limit.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause_until(self, until):
+        """
+        Withholds tokens until the monotonic time `until`; the bucket restarts empty.
+        """
+        with self._lock:
+            if until > self._paused_until:
+                self._paused_until = until
+                self._tokens = 0
+                self._updated = until
+
+
+class RetryBudget:
+    """
+    Caps retries to a fraction of recent traffic, so a failing API is not hammered.
+
+    Every request deposits `ratio` of a retry; a retry spends one. `minimum`
+    retries are always allowed so small runs can still recover.
+    """
+
+    def __init__(self, ratio=0.2, minimum=10):
+        self.ratio = ratio
+        self._balance = float(minimum)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._balance += self.ratio
+
+    def withdraw(self):
+        with self._lock:
+            if self._balance >= 1:
+                self._balance -= 1
+                return True
+            return False
+
+
+def parse_retry_after(value):
+    """
+    Parses a Retry-After header (delta-seconds or HTTP date) into seconds, or None.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def rate_limit_delay(headers):
+    """
+    Returns how long to wait before the next request according to the response's
+    rate-limit headers, or None when the API still has capacity.
+    """
+    retry_after = parse_retry_after(headers.get('Retry-After'))
+    if retry_after is not None:
+        return retry_after
+    remaining = headers.get('X-RateLimit-Remaining') or headers.get('RateLimit-Remaining')
+    reset = headers.get('X-RateLimit-Reset') or headers.get('RateLimit-Reset')
+    if remaining is None or reset is None:
+        return None
+    try:
+        remaining, reset = int(remaining), float(reset)
+    except ValueError:
+        return None
+    if remaining > 0:
+        return None
+    # Reset is either seconds from now or an epoch timestamp
+    return max(0.0, reset - time.time()) if reset > 1e9 else reset
+
+
+class RequestScheduler:
+    """
+    Paces and retries every request to one API.
+
+    Requests draw from a token bucket configured with the API's limit. A 429
+    (or an exhausted rate-limit header) pauses the whole bucket for the
+    advertised Retry-After, so concurrent workers back off together instead
+    of each burning a request. Retries use jittered exponential backoff and
+    are limited per request (max_retries) and overall (RetryBudget).
+    Non-idempotent requests are only retried on 429, which guarantees the
+    server did not act on them.
+    """
+
+    def __init__(self, rate, burst=None, max_retries=5, backoff_base=0.5, backoff_cap=30.0, retry_budget=None):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.retry_budget = retry_budget or RetryBudget()
+
+    def backoff(self, attempt):
+        """
+        Full-jitter exponential backoff for the given retry attempt (0-based).
+        """
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def _retry(self, attempt, delay=None):
+        if attempt >= self.max_retries or not self.retry_budget.withdraw():
+            return False
+        time.sleep(self.backoff(attempt) if delay is None else delay)
+        return True
+
+    def send(self, send_request, idempotent=True):
+        """
+        Calls send_request() (which returns a requests.Response) under the schedule.
+
+        Returns the final response; raises the last connection error when retries run out.
+        """
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            self.retry_budget.deposit()
+            try:
+                response = send_request()
+            except (requests.ConnectionError, requests.Timeout):
+                if idempotent and self._retry(attempt):
+                    attempt += 1
+                    continue
+                raise
+
+            delay = rate_limit_delay(response.headers)
+            if response.status_code == 429:
+                delay = self.backoff(attempt) if delay is None else delay
+                self.bucket.pause_until(time.monotonic() + delay)
+                if self._retry(attempt, 0):
+                    attempt += 1
+                    continue
+            elif delay:
+                # Out of quota but this request succeeded: hold the next ones until the reset
+                self.bucket.pause_until(time.monotonic() + delay)
+
+            if response.status_code in TRANSIENT_STATUS_CODES and idempotent and self._retry(attempt):
+                attempt += 1
+                continue
+            return response
+
+    def call(self, func, is_rate_limited, retry_after=None):
+        """
+        Runs func() for clients that raise instead of returning responses (the smartcar SDK).
+
+        is_rate_limited(exc) says whether an exception is a 429; retry_after(exc)
+        may return its Retry-After value.
+        """
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            self.retry_budget.deposit()
+            try:
+                return func()
+            except Exception as e:
+                if not is_rate_limited(e):
+                    raise
+                delay = parse_retry_after(retry_after(e)) if retry_after else None
+                delay = self.backoff(attempt) if delay is None else delay
+                self.bucket.pause_until(time.monotonic() + delay)
+                if not self._retry(attempt, 0):
+                    raise
+                attempt += 1
@@ -1,10 +1,94 @@
 #!/usr/bin/env python3
-import subprocess
+import argparse
 import datetime
+import logging
+import os
+import random
+import signal
+import subprocess
+import threading
+import time
+
+from logging_config import configure_logging
+
+logger = logging.getLogger(__name__)
+
+# Daemon mode: seconds between sync cycles, and the random +/- fraction applied to
+# each wait so several daemons do not hit the APIs in lockstep
+SYNC_INTERVAL = float(os.getenv("SYNC_INTERVAL", "900"))
+SYNC_JITTER = float(os.getenv("SYNC_JITTER", "0.1"))
+# Adaptive polling: each vehicle is polled about every POLL_TARGET_MILES of driving at
+# its recent odometer rate, between POLL_MIN_INTERVAL and POLL_MAX_INTERVAL seconds,
+# with all intervals stretched to stay within POLL_BUDGET_PER_HOUR polls (0 = no budget)
+ADAPTIVE_POLLING = os.getenv("ADAPTIVE_POLLING", "true").lower() in ("1", "true", "yes")
+POLL_MIN_INTERVAL = float(os.getenv("POLL_MIN_INTERVAL", "900"))
+POLL_MAX_INTERVAL = float(os.getenv("POLL_MAX_INTERVAL", "86400"))
+POLL_TARGET_MILES = float(os.getenv("POLL_TARGET_MILES", "10"))
+POLL_BUDGET_PER_HOUR = float(os.getenv("POLL_BUDGET_PER_HOUR", "0"))
+# Without adaptive polling, a vehicle is polled at most once per this many seconds
+VEHICLE_POLL_INTERVAL = float(os.getenv("VEHICLE_POLL_INTERVAL", "3600"))
+
+
+def run_once():
+    # Log the execution time
+    current_time = datetime.datetime.now()
+    logger.info("Running smart_fetch.py at %s", current_time)
+
+    # Run smart_fetch.py
+    subprocess.run(["python3", "smart_fetch.py"])
+
+
+def run_daemon():
+    """
+    Runs sync cycles in this process until SIGTERM or SIGINT.
+
+    Connection pools, the Smartcar token, the state store and the caches stay
+    warm between cycles. A signal lets the current cycle finish the vehicles
+    it has started, then exits.
+    """
+    import smart_fetch
+    from polling import AdaptivePollSchedule
+
+    poll_schedule = None
+    if ADAPTIVE_POLLING:
+        poll_schedule = AdaptivePollSchedule(
+            POLL_MIN_INTERVAL, POLL_MAX_INTERVAL, POLL_TARGET_MILES, POLL_BUDGET_PER_HOUR
+        )
+
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        logger.info("Received %s, stopping after the current cycle.", signal.Signals(signum).name)
+        stop.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    smart_fetch.open_sync_resources()
+    try:
+        while not stop.is_set():
+            started = time.monotonic()
+            logger.info("Running sync cycle at %s", datetime.datetime.now())
+            try:
+                smart_fetch.sync_cycle(
+                    poll_interval=VEHICLE_POLL_INTERVAL, stop_event=stop, poll_schedule=poll_schedule
+                )
+            except Exception as e:
+                logger.exception("Sync cycle failed: %s", e)
+            wait = SYNC_INTERVAL * random.uniform(1 - SYNC_JITTER, 1 + SYNC_JITTER)
+            stop.wait(max(0.0, wait - (time.monotonic() - started)))
+    finally:
+        smart_fetch.close_sync_resources()
+    logger.info("Sync daemon stopped.")
 
-# Log the execution time
-current_time = datetime.datetime.now()
-print(f"Running smart_fetch.py at {current_time}")
 
-# Run smart_fetch.py
-subprocess.run(["python3", "smart_fetch.py"])
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Smartcar to Fleetio sync once or as a daemon.")
+    parser.add_argument('--daemon', action='store_true',
+                        help="keep running, syncing every SYNC_INTERVAL seconds")
+    args = parser.parse_args()
+    configure_logging()
+    if args.daemon:
+        run_daemon()
+    else:
+        run_once()
@@ -1,13 +1,55 @@
 #!/usr/bin/env python3
 
-import requests
+import argparse
+import json
+import logging
 import os
+import threading
+import time
+import requests
 from dotenv import load_dotenv
 from datetime import datetime
 
+from clients import (
+    FLEETIO_API_URL as DEFAULT_FLEETIO_API_URL,
+    SMARTCAR_API_URL as DEFAULT_SMARTCAR_API_URL,
+    SMARTCAR_AUTH_URL as DEFAULT_SMARTCAR_AUTH_URL,
+    FleetioClient,
+    SmartcarClient,
+)
+from fleetio_index import VehicleLookup, load_fleetio_index, open_fleetio_cache
+from smartcar_backends import RestBackend, SmartcarError
+from rate_limit import RequestScheduler
+from state_store import open_state_store
+from outbox import OutboxDrainer, open_outbox
+from token_manager import TokenManager
+from credential_store import CredentialStore
+from pipeline import run_pipeline
+from polling import odometer_rate
+from attribute_cache import AttributeCache
+from metrics import RunMetrics
+from logging_config import configure_logging
+from vehicle_health import VehicleHealth
+
+logger = logging.getLogger(__name__)
+
 # Load environment variables from .env file
 load_dotenv()
 
+# How Smartcar is reached: 'rest' (SmartcarClient below) or 'sdk' (the smartcar Python SDK,
+# imported only when chosen). smart_fetch_sdk.py selects 'sdk'.
+SMARTCAR_BACKEND = os.getenv("SMARTCAR_BACKEND", "rest").lower()
+
+
+def _backend_setting(name, default, sdk_default):
+    """
+    Reads a setting the SDK backend keeps apart: NAME, or NAME_SDK under the SDK backend.
+    """
+    if SMARTCAR_BACKEND == 'sdk':
+        return os.getenv(f"{name}_SDK", sdk_default)
+    return os.getenv(name, default)
+
+
 # Smartcar and Fleetio API credentials
 SMARTCAR_CLIENT_ID = os.getenv("SMARTCAR_CLIENT_ID")
 SMARTCAR_CLIENT_SECRET = os.getenv("SMARTCAR_CLIENT_SECRET")
@@ -15,178 +57,437 @@ REDIRECT_URI = os.getenv("REDIRECT_URI")
 FLEETIO_API_TOKEN = os.getenv("FLEETIO_API_TOKEN")
 FLEETIO_ACCOUNT_TOKEN = os.getenv("FLEETIO_ACCOUNT_TOKEN")
 
-
-def update_env_file(new_tokens):
+# API endpoints (overridable so the sync can be pointed at a local stub server)
+SMARTCAR_API_URL = os.getenv("SMARTCAR_API_URL", DEFAULT_SMARTCAR_API_URL)
+SMARTCAR_AUTH_URL = os.getenv("SMARTCAR_AUTH_URL", DEFAULT_SMARTCAR_AUTH_URL)
+FLEETIO_API_URL = os.getenv("FLEETIO_API_URL", DEFAULT_FLEETIO_API_URL)
+
+# Concurrency settings: how many vehicles are synced at once, and how many
+# requests may be in flight against each API at any moment
+SYNC_MAX_WORKERS = int(os.getenv("SYNC_MAX_WORKERS", "1"))
+SMARTCAR_MAX_CONCURRENCY = int(os.getenv("SMARTCAR_MAX_CONCURRENCY", "8"))
+FLEETIO_MAX_CONCURRENCY = int(os.getenv("FLEETIO_MAX_CONCURRENCY", "4"))
+# Vehicles buffered between pipeline stages (listing -> Smartcar fetch -> Fleetio write)
+SYNC_QUEUE_SIZE = int(os.getenv("SYNC_QUEUE_SIZE", "100"))
+
+# Vehicle IDs requested per Smartcar /vehicles page (Smartcar allows at most 50)
+SMARTCAR_PAGE_SIZE = int(os.getenv("SMARTCAR_PAGE_SIZE", "50"))
+
+# Seconds to wait for any single API response
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "30"))
+# Smartcar responses wait on the carmaker's backend, which for some makes takes tens of
+# seconds; a lower value bounds how long one slow vehicle can hold up the run
+SMARTCAR_REQUEST_TIMEOUT = float(os.getenv("SMARTCAR_REQUEST_TIMEOUT", str(REQUEST_TIMEOUT)))
+
+# Sustained requests per second and burst size for each API; set these to the
+# limits published for your Smartcar plan and Fleetio account
+SMARTCAR_RATE_LIMIT = float(os.getenv("SMARTCAR_RATE_LIMIT", "10"))
+SMARTCAR_RATE_BURST = int(os.getenv("SMARTCAR_RATE_BURST", "10"))
+FLEETIO_RATE_LIMIT = float(os.getenv("FLEETIO_RATE_LIMIT", "5"))
+FLEETIO_RATE_BURST = int(os.getenv("FLEETIO_RATE_BURST", "5"))
+# Retries per request for 429s and transient errors
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "5"))
+
+# Rotating Smartcar tokens live in the credentials file (.env by default), which is
+# read once and rewritten atomically under a file lock when they change
+CREDENTIALS_PATH = os.getenv("CREDENTIALS_PATH", ".env")
+credential_store = CredentialStore(CREDENTIALS_PATH)
+SMARTCAR_TOKEN_KEYS = tuple(
+    key + ('_SDK' if SMARTCAR_BACKEND == 'sdk' else '')
+    for key in ('SMARTCAR_ACCESS_TOKEN', 'SMARTCAR_REFRESH_TOKEN', 'SMARTCAR_TOKEN_EXPIRES_AT')
+)
+
+# Smartcar tokens, refreshed shortly before SMARTCAR_TOKEN_EXPIRES_AT (created on first use)
+token_manager = None
+
+# Timing of every API request and pipeline stage, summarized at the end of each run or
+# cycle and optionally exported as JSON lines and a Prometheus text file
+METRICS_JSONL_PATH = _backend_setting("METRICS_JSONL_PATH", "", "")
+METRICS_PROMETHEUS_PATH = _backend_setting("METRICS_PROMETHEUS_PATH", "", "")
+metrics = RunMetrics()
+
+# Shared clients: keep-alive connection pools reused by every request below,
+# each paced by its API's rate limiter
+smartcar_client = SmartcarClient(
+    SMARTCAR_API_URL, SMARTCAR_AUTH_URL,
+    timeout=SMARTCAR_REQUEST_TIMEOUT, max_concurrency=SMARTCAR_MAX_CONCURRENCY,
+    scheduler=RequestScheduler(SMARTCAR_RATE_LIMIT, SMARTCAR_RATE_BURST, max_retries=HTTP_MAX_RETRIES),
+    metrics=metrics
+)
+fleetio_client = FleetioClient(
+    FLEETIO_API_TOKEN, FLEETIO_ACCOUNT_TOKEN, FLEETIO_API_URL,
+    timeout=REQUEST_TIMEOUT, max_concurrency=FLEETIO_MAX_CONCURRENCY,
+    scheduler=RequestScheduler(FLEETIO_RATE_LIMIT, FLEETIO_RATE_BURST, max_retries=HTTP_MAX_RETRIES),
+    metrics=metrics
+)
+
+# The Smartcar backend, created on first use (see get_smartcar_backend)
+smartcar_backend = None
+_smartcar_backend_guard = threading.Lock()
+
+# Fetch attributes, VIN and odometer in one Smartcar batch request when attributes are not cached
+SMARTCAR_BATCH = os.getenv("SMARTCAR_BATCH", "true").lower() in ("1", "true", "yes")
+
+# Load the whole Fleetio vehicle list once per run and answer VIN lookups locally;
+# it is loaded on the first lookup, so runs where every vehicle is known skip it
+FLEETIO_PREFETCH = os.getenv("FLEETIO_PREFETCH", "true").lower() in ("1", "true", "yes")
+fleetio_index = None
+_fleetio_index_loaded = False
+_fleetio_index_guard = threading.Lock()
+# Local copy of the Fleetio vehicle list; after the first full load only vehicles updated
+# since the last refresh are fetched. Set to an empty value to load the full list every run.
+FLEETIO_INDEX_PATH = _backend_setting("FLEETIO_INDEX_PATH", ".fleetio_vehicles.db", ".fleetio_vehicles_sdk.db")
+# Reload the full list after this many seconds, which drops vehicles deleted in Fleetio
+FLEETIO_INDEX_FULL_REFRESH = float(os.getenv("FLEETIO_INDEX_FULL_REFRESH", str(7 * 24 * 3600)))
+fleetio_cache = None
+
+# Strict mode re-reads a found vehicle from Fleetio when its record is older than the TTL (seconds)
+FLEETIO_STRICT_VERIFY = os.getenv("FLEETIO_STRICT_VERIFY", "false").lower() in ("1", "true", "yes")
+FLEETIO_VERIFY_TTL = float(os.getenv("FLEETIO_VERIFY_TTL", "3600"))
+
+# Local per-vehicle sync state; set SYNC_STATE_PATH to an empty value to disable
+SYNC_STATE_PATH = _backend_setting("SYNC_STATE_PATH", ".sync_state.db", ".sync_state_sdk.db")
+state_store = None
+
+# Make, model, year and VIN never change for a Smartcar vehicle; re-fetch them only after this many seconds
+ATTRIBUTE_CACHE_MAX_AGE = float(os.getenv("ATTRIBUTE_CACHE_MAX_AGE", str(30 * 24 * 3600)))
+attribute_cache = None
+
+# Durable queue for meter entries: they are recorded locally first and sent in the
+# background, so failed writes are retried on later runs. Set to an empty value to
+# post meter entries directly instead.
+FLEETIO_OUTBOX_PATH = _backend_setting("FLEETIO_OUTBOX_PATH", ".fleetio_outbox.db", ".fleetio_outbox_sdk.db")
+outbox = None
+
+# Local history of every odometer reading (needs NumPy). Readings at or below zero, below
+# the vehicle's last reading or implying more than ODOMETER_MAX_SPEED mph since it are
+# rejected before they reach Fleetio. Set to an empty value to disable.
+ODOMETER_STORE_PATH = _backend_setting("ODOMETER_STORE_PATH", ".odometer_store", ".odometer_store_sdk")
+ODOMETER_MAX_SPEED = float(os.getenv("ODOMETER_MAX_SPEED", "200"))
+odometer_store = None
+
+# Readings less than this many miles above the last Fleetio meter value are not posted;
+# readings at or below it (conversion jitter, odometer resets) never are
+METER_MIN_DELTA = float(os.getenv("METER_MIN_DELTA", "0.5"))
+# Queued meter entries are held this many seconds; a newer reading for the same
+# vehicle within the window replaces the held one (needs the outbox)
+METER_COALESCE_WINDOW = float(os.getenv("METER_COALESCE_WINDOW", "60"))
+
+# Makes and vehicles whose Smartcar fetches fail this many times in a row are skipped
+# for SMARTCAR_BREAKER_COOLDOWN seconds
+SMARTCAR_BREAKER_MAKE_FAILURES = int(os.getenv("SMARTCAR_BREAKER_MAKE_FAILURES", "5"))
+SMARTCAR_BREAKER_VEHICLE_FAILURES = int(os.getenv("SMARTCAR_BREAKER_VEHICLE_FAILURES", "3"))
+SMARTCAR_BREAKER_COOLDOWN = float(os.getenv("SMARTCAR_BREAKER_COOLDOWN", "900"))
+# Send a second copy of an odometer read that outlasts its make's p95 latency and use
+# whichever answers first
+SMARTCAR_HEDGE = os.getenv("SMARTCAR_HEDGE", "false").lower() in ("1", "true", "yes")
+vehicle_health = VehicleHealth(
+    SMARTCAR_BREAKER_MAKE_FAILURES, SMARTCAR_BREAKER_VEHICLE_FAILURES, SMARTCAR_BREAKER_COOLDOWN
+)
+
+_vin_locks = {}
+_vin_locks_guard = threading.Lock()
+
+
+def _vin_lock(vin):
     """
-    Updates the .env file with new token values.
+    Returns the lock serializing Fleetio writes for a single VIN.
     """
-    from dotenv import dotenv_values
-    env_path = ".env"
-    env_vars = dotenv_values(env_path)
-    env_vars.update(new_tokens)
+    with _vin_locks_guard:
+        return _vin_locks.setdefault(vin, threading.Lock())
 
-    with open(env_path, 'w') as env_file:
-        for key, value in env_vars.items():
-            env_file.write(f"{key}={value}\n")
 
+def get_smartcar_backend():
+    """
+    Returns the Smartcar backend chosen by SMARTCAR_BACKEND, creating it on first use.
 
-def get_smartcar_access_token():
+    The SDK backend imports the smartcar SDK and builds its AuthClient only
+    here, so REST runs never load it.
     """
-    Retrieves a valid Smartcar access token, refreshing it if necessary.
-    """
-    access_token = os.getenv("SMARTCAR_ACCESS_TOKEN")
-    refresh_token = os.getenv("SMARTCAR_REFRESH_TOKEN")
-    if access_token:
-        headers = {'Authorization': f'Bearer {access_token}'}
-        if requests.get("https://api.smartcar.com/v1.0/vehicles", headers=headers).status_code == 200:
-            return access_token
-        elif refresh_token:
-            token_response = requests.post(
-                "https://auth.smartcar.com/oauth/token",
-                data={
-                    "client_id": SMARTCAR_CLIENT_ID,
-                    "client_secret": SMARTCAR_CLIENT_SECRET,
-                    "grant_type": "refresh_token",
-                    "refresh_token": refresh_token,
-                },
-            )
-            if token_response.status_code == 200:
-                token_data = token_response.json()
-                update_env_file({
-                    'SMARTCAR_ACCESS_TOKEN': token_data.get("access_token"),
-                    'SMARTCAR_REFRESH_TOKEN': token_data.get("refresh_token")
-                })
-                return token_data.get("access_token")
+    global smartcar_backend
+    with _smartcar_backend_guard:
+        if smartcar_backend is None:
+            if SMARTCAR_BACKEND == 'sdk':
+                from smartcar_sdk_backend import SdkBackend
+                smartcar_backend = SdkBackend(
+                    SMARTCAR_CLIENT_ID, SMARTCAR_CLIENT_SECRET, REDIRECT_URI, smartcar_client.scheduler, metrics,
+                    timeout=SMARTCAR_REQUEST_TIMEOUT
+                )
             else:
-                print("Failed to refresh Smartcar token.")
-        else:
-            print("Access token expired and no refresh token available.")
-    else:
-        print("No Smartcar access token found.")
-    return None
+                smartcar_backend = RestBackend(smartcar_client, SMARTCAR_CLIENT_ID, SMARTCAR_CLIENT_SECRET)
+        return smartcar_backend
+
+
+def get_smartcar_access_token():
+    """
+    Retrieves a valid Smartcar access token, refreshing it if it is about to expire.
+
+    The token is not validated with an API request: if Smartcar rejects it
+    anyway, the backend refreshes it and retries once. Without any stored
+    token, backends that can (the SDK) run the OAuth flow in the terminal.
+    """
+    global token_manager
+    if token_manager is None:
+        backend = get_smartcar_backend()
+        manager = TokenManager.from_store(backend.refresh_token, credential_store, SMARTCAR_TOKEN_KEYS)
+        if not manager.access_token and not manager.refresh_token:
+            tokens = backend.authorize()
+            if not tokens:
+                logger.error("No Smartcar access token found.")
+                return None
+            credential_store.update(dict(zip(SMARTCAR_TOKEN_KEYS, (
+                tokens['access_token'], tokens['refresh_token'], f"{time.time() + tokens['expires_in']:.0f}"
+            ))))
+            manager = TokenManager.from_store(backend.refresh_token, credential_store, SMARTCAR_TOKEN_KEYS)
+        token_manager = manager
+        backend.token_manager = token_manager
+    return token_manager.get()
+
+
+def iter_vehicle_ids(access_token, page_size=SMARTCAR_PAGE_SIZE):
+    """
+    Yields the vehicle IDs associated with the Smartcar access token, one
+    /vehicles page (limit/offset) at a time.
+
+    Raises SmartcarError if a page cannot be fetched.
+    """
+    return get_smartcar_backend().iter_vehicle_ids(access_token, page_size)
 
 
 def get_vehicle_ids(access_token):
     """
     Retrieves a list of vehicle IDs associated with the Smartcar access token.
     """
-    response = requests.get(
-        "https://api.smartcar.com/v1.0/vehicles",
-        headers={'Authorization': f'Bearer {access_token}'}
-    )
-    if response.status_code == 200:
-        return response.json().get('vehicles', [])
-    else:
-        print(f"Failed to fetch vehicles from Smartcar: {response.status_code} - {response.text}")
+    try:
+        return list(iter_vehicle_ids(access_token))
+    except SmartcarError as e:
+        logger.error("Failed to fetch vehicles from Smartcar: %s", e)
         return []
 
 
+def _cache_attributes(vehicle_id, attributes):
+    if attribute_cache is not None and attributes['vin']:
+        attribute_cache.put(vehicle_id, attributes)
+
+
+def fetch_vehicle_attributes(access_token, vehicle_id):
+    """
+    Fetches a vehicle's make, model, year and VIN, from the attribute cache when possible.
+    """
+    if attribute_cache is not None:
+        cached = attribute_cache.get(vehicle_id)
+        if cached:
+            return cached
+    return _fetch_attributes(access_token, vehicle_id)
+
+
+def _fetch_attributes(access_token, vehicle_id):
+    # Past the cache lookup, so each vehicle counts as one hit or miss
+    attributes = get_smartcar_backend().fetch_attributes(access_token, vehicle_id)
+    if attributes is not None:
+        _cache_attributes(vehicle_id, attributes)
+    return attributes
+
+
+def fetch_vehicle_odometer(access_token, vehicle_id, make=None):
+    """
+    Fetches a vehicle's odometer reading in miles, or None if the request fails.
+
+    When the make is known the read's latency is tracked under it, and with
+    SMARTCAR_HEDGE a read slower than the make's p95 is hedged.
+    """
+    hedge_after = vehicle_health.hedge_delay(make) if SMARTCAR_HEDGE else None
+    started = time.perf_counter()
+    mileage = get_smartcar_backend().fetch_odometer(access_token, vehicle_id, hedge_after=hedge_after)
+    if mileage is not None and make:
+        vehicle_health.record_latency(make, time.perf_counter() - started)
+    return mileage
+
+
+def fetch_vehicle_signals(access_token, vehicle_id):
+    """
+    Fetches a vehicle's attributes and odometer reading with as few Smartcar requests as possible.
+
+    Cached attributes leave a single odometer GET; otherwise, in batch mode,
+    attributes, VIN and odometer come back from one batch call. Returns
+    (attributes, mileage): attributes is None if they could not be fetched,
+    mileage is None if only the odometer failed.
+    """
+    if attribute_cache is not None:
+        cached = attribute_cache.get(vehicle_id)
+        if cached:
+            return cached, fetch_vehicle_odometer(access_token, vehicle_id, cached['make'])
+
+    if not SMARTCAR_BATCH:
+        attributes = _fetch_attributes(access_token, vehicle_id)
+        if attributes is None:
+            return None, None
+        return attributes, fetch_vehicle_odometer(access_token, vehicle_id, attributes['make'])
+
+    attributes, mileage = get_smartcar_backend().fetch_batch(access_token, vehicle_id)
+    if attributes is None:
+        return None, None
+    _cache_attributes(vehicle_id, attributes)
+    return attributes, mileage
+
+
+def fetch_vehicle(access_token, vehicle_id):
+    """
+    Fetches a vehicle's attributes and odometer like fetch_vehicle_signals, behind the circuit breakers.
+
+    Vehicles whose make or own fetches keep failing are skipped until their
+    cooldown ends. Request errors and timeouts count as a failed fetch
+    instead of stopping the run. Returns (attributes, mileage), (None, None)
+    when skipped or failed.
+    """
+    state = state_store.get(vehicle_id) if state_store is not None else None
+    make = state['make'] if state else None
+    reason = vehicle_health.skip_reason(vehicle_id, make)
+    if reason:
+        logger.debug("Skipping vehicle ID %s: %s.", vehicle_id, reason)
+        return None, None
+
+    try:
+        attributes, mileage = fetch_vehicle_signals(access_token, vehicle_id)
+    except requests.RequestException as e:
+        logger.error("Error fetching vehicle ID %s from Smartcar: %s", vehicle_id, e)
+        attributes, mileage = None, None
+    if attributes is not None:
+        make = attributes['make']
+    for breaker in vehicle_health.record(vehicle_id, make, attributes is not None and mileage is not None):
+        if breaker == 'make':
+            logger.warning("Smartcar fetches for %s vehicles keep failing; skipping the make for %.0fs.",
+                           make, SMARTCAR_BREAKER_COOLDOWN)
+        else:
+            logger.warning("Smartcar fetches for vehicle ID %s keep failing; skipping it for %.0fs.",
+                           vehicle_id, SMARTCAR_BREAKER_COOLDOWN)
+    return attributes, mileage
+
+
 def fetch_vehicle_details(access_token, vehicle_id):
     """
     Fetches vehicle details including VIN and odometer reading.
     """
-    headers = {'Authorization': f'Bearer {access_token}'}
-    
-    # Fetch basic vehicle data
-    vehicle_response = requests.get(f"https://api.smartcar.com/v1.0/vehicles/{vehicle_id}", headers=headers)
-    if vehicle_response.status_code != 200:
-        print(f"Failed to fetch vehicle data for ID {vehicle_id}: {vehicle_response.status_code} - {vehicle_response.text}")
-        return None
-    vehicle_data = vehicle_response.json()
-    
-    # Fetch VIN
-    vin_response = requests.get(f"https://api.smartcar.com/v1.0/vehicles/{vehicle_id}/vin", headers=headers)
-    if vin_response.status_code != 200:
-        print(f"Failed to fetch VIN for vehicle ID {vehicle_id}: {vin_response.status_code} - {vin_response.text}")
+    attributes, mileage = fetch_vehicle_signals(access_token, vehicle_id)
+    if attributes is None:
         return None
-    vin_data = vin_response.json()
-    vehicle_data['vin'] = vin_data.get('vin')
-    
-    # Fetch odometer data
-    odometer_response = requests.get(f"https://api.smartcar.com/v1.0/vehicles/{vehicle_id}/odometer", headers=headers)
-    if odometer_response.status_code != 200:
-        print(f"Failed to fetch odometer for vehicle ID {vehicle_id}: {odometer_response.status_code} - {odometer_response.text}")
-        distance_km = 0
+    return _vehicle_data(attributes, mileage)
+
+
+def _vehicle_data(attributes, mileage):
+    if mileage is None:
+        logger.debug("No odometer reading for %s %s (%s)", attributes['make'], attributes['model'], attributes['year'])
     else:
-        odometer_data = odometer_response.json()
-        distance_km = odometer_data.get('distance', 0)
-    
-    mileage = distance_km / 1.60934  # Convert to miles if distance is in kilometers
-    vehicle_data['mileage'] = mileage
+        logger.debug("Odometer for %s %s (%s): %.2f miles", attributes['make'], attributes['model'], attributes['year'], mileage)
 
-    make = vehicle_data.get('make', 'Unknown Make')
-    model = vehicle_data.get('model', 'Unknown Model')
-    year = vehicle_data.get('year', 'Unknown Year')
-    
-    print(f"Odometer for {make} {model} ({year}): {mileage:.2f} miles")
-    
-    return {
-        'make': make,
-        'model': model,
-        'year': year,
-        'vin': vehicle_data.get('vin'),
-        'mileage': mileage
-    }
+    return dict(attributes, mileage=mileage)
+
+
+def reset_fleetio_index():
+    """
+    Forgets the loaded Fleetio index so the next lookup loads a fresh one.
+    """
+    global fleetio_index, _fleetio_index_loaded
+    with _fleetio_index_guard:
+        fleetio_index, _fleetio_index_loaded = None, False
+
+
+def _fetch_fleetio_index():
+    """
+    Refreshes the local Fleetio vehicle copy when there is one, else pages through the full list.
+    """
+    with metrics.stage('fleetio_index'):
+        if fleetio_cache is not None:
+            return fleetio_cache.refresh(fleetio_client)
+        return load_fleetio_index(fleetio_client)
+
+
+def _load_fleetio_index_once():
+    """
+    Loads the Fleetio vehicle index on first use when prefetch is enabled.
+    """
+    global fleetio_index, _fleetio_index_loaded
+    with _fleetio_index_guard:
+        if FLEETIO_PREFETCH and not _fleetio_index_loaded:
+            fleetio_index = _fetch_fleetio_index()
+            _fleetio_index_loaded = True
+
+
+def prefetch_fleetio_index():
+    """
+    Loads the Fleetio vehicle index now, whatever FLEETIO_PREFETCH says, unless one is loaded.
+
+    Returns the index, or None if the listing failed.
+    """
+    global fleetio_index, _fleetio_index_loaded
+    with _fleetio_index_guard:
+        if fleetio_index is None:
+            fleetio_index = _fetch_fleetio_index()
+            _fleetio_index_loaded = True
+        return fleetio_index
 
 
 def find_vehicle_in_fleetio_by_vin(vin):
     """
-    Searches for a vehicle in Fleetio by VIN.
+    Searches for a vehicle in Fleetio by VIN, using the prefetched index when loaded.
+
+    Returns a VehicleLookup carrying the full vehicle record, or None.
     """
-    fleetio_headers = {
-        'Authorization': f'Token token={FLEETIO_API_TOKEN}',
-        'Account-Token': FLEETIO_ACCOUNT_TOKEN,
-        'Content-Type': 'application/json'
-    }
-    response = requests.get(
-        'https://secure.fleetio.com/api/v1/vehicles',
-        headers=fleetio_headers,
-        params={'q[vin_eq]': vin}
-    )
+    _load_fleetio_index_once()
+    if fleetio_index is not None:
+        lookup = fleetio_index.find_by_vin(vin)
+        if lookup:
+            logger.debug("Found vehicle in Fleetio with VIN '%s' and ID %s.", vin, lookup.id)
+            return lookup
+        logger.debug("No vehicle found in Fleetio with VIN: %s", vin)
+        return None
+
+    response = fleetio_client.get('/vehicles', params={'q[vin_eq]': vin})
 
     if response.status_code == 200:
         vehicles = response.json().get('records', [])
         if vehicles:
-            vehicle_id = vehicles[0].get('id')
-            print(f"Found vehicle in Fleetio with VIN '{vin}' and ID {vehicle_id}.")
-            return vehicle_id
+            lookup = VehicleLookup(vehicles[0])
+            logger.debug("Found vehicle in Fleetio with VIN '%s' and ID %s.", vin, lookup.id)
+            return lookup
         else:
-            print(f"No vehicle found in Fleetio with VIN: {vin}")
+            logger.debug("No vehicle found in Fleetio with VIN: %s", vin)
     else:
-        print(f"Error searching for vehicle by VIN '{vin}': {response.status_code} - {response.text}")
+        logger.error("Error searching for vehicle by VIN '%s': %s - %s", vin, response.status_code, response.text)
     return None
 
 
-def verify_vehicle_exists(vehicle_id):
+def fetch_fleetio_vehicle(vehicle_id):
     """
-    Verifies that a vehicle with the given ID exists in Fleetio.
+    Re-reads a vehicle record from Fleetio by ID.
+
+    Returns a fresh VehicleLookup (also stored in the index when loaded), or None if it no longer exists.
     """
-    fleetio_headers = {
-        'Authorization': f'Token token={FLEETIO_API_TOKEN}',
-        'Account-Token': FLEETIO_ACCOUNT_TOKEN,
-        'Content-Type': 'application/json'
-    }
-    response = requests.get(
-        f'https://secure.fleetio.com/api/v1/vehicles/{vehicle_id}',
-        headers=fleetio_headers
-    )
+    response = fleetio_client.get(f'/vehicles/{vehicle_id}')
     if response.status_code == 200:
-        print(f"Vehicle ID {vehicle_id} exists in Fleetio.")
-        return True
+        logger.debug("Vehicle ID %s exists in Fleetio.", vehicle_id)
+        if fleetio_index is not None:
+            return fleetio_index.add(response.json())
+        return VehicleLookup(response.json())
     else:
-        print(f"Vehicle ID {vehicle_id} does not exist: {response.status_code} - {response.text}")
-        return False
+        logger.warning("Vehicle ID %s does not exist: %s - %s", vehicle_id, response.status_code, response.text)
+        return None
+
+
+def verify_vehicle_exists(vehicle_id):
+    """
+    Verifies that a vehicle with the given ID exists in Fleetio.
+    """
+    return fetch_fleetio_vehicle(vehicle_id) is not None
 
 
 def create_vehicle_meter_entry_in_fleetio(vehicle_id, mileage, meter_type=None):
     """
-    Creates a meter entry for a vehicle in Fleetio.
+    Creates a meter entry for a vehicle in Fleetio. Returns True on success.
+
+    With the outbox enabled the entry is queued for the background drainer
+    and True means it was recorded durably.
     """
-    fleetio_headers = {
-        'Authorization': f'Token token={FLEETIO_API_TOKEN}',
-        'Account-Token': FLEETIO_ACCOUNT_TOKEN,
-        'Content-Type': 'application/json'
-    }
     payload = {
         'vehicle_id': vehicle_id,
         'value': mileage,  
@@ -196,40 +497,116 @@ def create_vehicle_meter_entry_in_fleetio(vehicle_id, mileage, meter_type=None):
     if meter_type == 'secondary':
         payload['meter_type'] = 'secondary'
 
-    print(f"Creating meter entry for vehicle ID {vehicle_id} with mileage {mileage:.2f} miles.")
-    response = requests.post(
-        'https://secure.fleetio.com/api/v1/meter_entries', 
-        headers=fleetio_headers,
-        json=payload
-    )
+    if outbox is not None:
+        outbox.enqueue(
+            'POST', '/meter_entries', payload,
+            coalesce_key=f"meter:{vehicle_id}:{meter_type or 'primary'}", delay=METER_COALESCE_WINDOW
+        )
+        logger.debug("Queued meter entry for vehicle ID %s with mileage %.2f miles.", vehicle_id, mileage)
+        return True
+
+    logger.debug("Creating meter entry for vehicle ID %s with mileage %.2f miles.", vehicle_id, mileage)
+    response = fleetio_client.post('/meter_entries', json=payload)
 
     if response.status_code == 201:
-        print(f"Successfully created meter entry for vehicle ID {vehicle_id} with mileage {mileage:.2f} miles.")
+        logger.debug("Successfully created meter entry for vehicle ID %s with mileage %.2f miles.", vehicle_id, mileage)
+        return True
     else:
-        print(f"Error creating meter entry for vehicle ID {vehicle_id}: {response.status_code} - {response.text}")
+        logger.error("Error creating meter entry for vehicle ID %s: %s - %s", vehicle_id, response.status_code, response.text)
+        return False
+
+
+def forget_fleetio_vehicle(fleetio_id):
+    """
+    Unlinks a Fleetio vehicle that rejects meter entries (deleted or archived), so the
+    next sync of each Smartcar vehicle linked to it looks its VIN up again.
+    """
+    unlinked = state_store.forget_fleetio_vehicle(fleetio_id) if state_store is not None else 0
+    if fleetio_cache is not None:
+        fleetio_cache.remove(fleetio_id)
+    if fleetio_index is not None:
+        fleetio_index.remove(fleetio_id)
+    logger.warning("Fleetio vehicle ID %s no longer takes meter entries; %d vehicle(s) will be looked up again by VIN.", fleetio_id, unlinked)
+
+
+def _outbox_write_dead(entry, status):
+    """
+    Outbox callback for writes marked dead: a queued meter entry rejected because its
+    vehicle is gone is handled like a failed direct post.
+    """
+    if entry['path'] == '/meter_entries' and status in (404, 422):
+        forget_fleetio_vehicle(json.loads(entry['payload'])['vehicle_id'])
+
+
+def meter_skip_reason(mileage, last_meter, min_delta=METER_MIN_DELTA):
+    """
+    Returns why a reading should not be posted over the last Fleetio meter value, or None to post it.
+    """
+    if mileage <= 0:
+        return "not above zero"
+    if last_meter is None:
+        return None
+    delta = round(mileage - last_meter, 2)
+    if delta == 0:
+        return "unchanged"
+    if delta < 0:
+        return "lower than Fleetio"
+    if delta < min_delta:
+        return f"less than {min_delta:g} miles above Fleetio"
+    return None
+
+
+def post_meter_reading(vehicle_id, mileage, last_meter):
+    """
+    Creates a meter entry unless the reading does not advance the Fleetio meter enough.
+
+    Returns the meter value Fleetio holds afterwards, or None if the entry failed.
+    """
+    reason = meter_skip_reason(mileage, last_meter)
+    if reason:
+        logger.debug("Odometer for vehicle ID %s at %.2f miles is %s (Fleetio: %s). Skipping meter entry.",
+                     vehicle_id, mileage, reason, last_meter)
+        return last_meter
+    if create_vehicle_meter_entry_in_fleetio(vehicle_id, mileage):
+        return mileage
+    return None
 
 
 def create_or_update_vehicle_in_fleetio(vehicle_data):
     """
-    Creates a new vehicle in Fleetio or updates an existing one, then creates a meter entry.
+    Creates a new vehicle in Fleetio or updates an existing one, then creates a meter entry
+    when there is a mileage reading.
+
+    Returns (fleetio_id, fleetio_meter): the Fleetio vehicle ID once its meter entry is
+    recorded (or when there is no reading to record) and the meter value Fleetio holds
+    afterwards, or (None, None).
     """
     vin = vehicle_data['vin']
     if not vin:
-        print("VIN is missing. Skipping vehicle.")
-        return
-
-    vehicle_id = find_vehicle_in_fleetio_by_vin(vin)
-
-    if vehicle_id:
-        print(f"Vehicle with VIN '{vin}' found in Fleetio with ID {vehicle_id}.")
-        if verify_vehicle_exists(vehicle_id):
-            create_vehicle_meter_entry_in_fleetio(vehicle_id, vehicle_data['mileage'])
+        logger.warning("VIN is missing. Skipping vehicle.")
+        return None, None
+
+    # Two Smartcar vehicles reporting the same VIN must not both create it
+    with _vin_lock(vin):
+        return _create_or_update_vehicle_in_fleetio(vehicle_data, vin)
+
+
+def _create_or_update_vehicle_in_fleetio(vehicle_data, vin):
+    lookup = find_vehicle_in_fleetio_by_vin(vin)
+
+    if lookup:
+        logger.debug("Vehicle with VIN '%s' found in Fleetio with ID %s.", vin, lookup.id)
+        # The lookup already holds the full record; only re-read it in strict mode once it is old
+        if FLEETIO_STRICT_VERIFY and lookup.is_stale(FLEETIO_VERIFY_TTL):
+            lookup = fetch_fleetio_vehicle(lookup.id)
+            if not lookup:
+                return None, None
+        if vehicle_data['mileage'] is None:
+            return lookup.id, lookup.current_meter_value
+        fleetio_meter = post_meter_reading(lookup.id, vehicle_data['mileage'], lookup.current_meter_value)
+        if fleetio_meter is not None:
+            return lookup.id, fleetio_meter
     else:
-        fleetio_headers = {
-            'Authorization': f'Token token={FLEETIO_API_TOKEN}',
-            'Account-Token': FLEETIO_ACCOUNT_TOKEN,
-            'Content-Type': 'application/json'
-        }
         fleetio_payload = {
             'make': vehicle_data['make'],
             'model': vehicle_data['model'],
@@ -241,39 +618,361 @@ def create_or_update_vehicle_in_fleetio(vehicle_data):
             'vehicle_status_name': 'Active'
         }
 
-        response = requests.post(
-            'https://secure.fleetio.com/api/v1/vehicles',
-            headers=fleetio_headers,
-            json=fleetio_payload
-        )
+        response = fleetio_client.post('/vehicles', json=fleetio_payload)
 
         if response.status_code == 201:
-            new_vehicle_id = response.json().get('id')
-            print(f"Vehicle '{vehicle_data['year']} {vehicle_data['make']} {vehicle_data['model']}' created in Fleetio with ID {new_vehicle_id}.")
-            create_vehicle_meter_entry_in_fleetio(new_vehicle_id, vehicle_data['mileage'])
+            new_vehicle = response.json()
+            new_vehicle_id = new_vehicle.get('id')
+            if fleetio_index is not None:
+                fleetio_index.add(new_vehicle)
+            logger.info("Vehicle '%s %s %s' created in Fleetio with ID %s.",
+                        vehicle_data['year'], vehicle_data['make'], vehicle_data['model'], new_vehicle_id)
+            if vehicle_data['mileage'] is None:
+                return new_vehicle_id, None
+            fleetio_meter = post_meter_reading(new_vehicle_id, vehicle_data['mileage'], None)
+            if fleetio_meter is not None:
+                return new_vehicle_id, fleetio_meter
         else:
-            print(f"Error creating vehicle in Fleetio with VIN '{vin}': {response.status_code} - {response.text}")
+            logger.error("Error creating vehicle in Fleetio with VIN '%s': %s - %s", vin, response.status_code, response.text)
+    return None, None
 
 
-def main():
+def sync_known_vehicle(vehicle_id, state, mileage):
     """
-    Main function to execute the Smartcar to Fleetio data synchronization.
+    Syncs a vehicle already in the state store, posting a meter entry only when the reading
+    advances the Fleetio meter by at least METER_MIN_DELTA.
+    """
+    now = time.time()
+    reading = {'last_odometer': mileage, 'last_odometer_at': now, 'odometer_rate': odometer_rate(state, mileage, now)}
+    # States from before fleetio_meter was tracked last posted their last reading
+    last_meter = state['fleetio_meter'] if state['fleetio_meter'] is not None else state['last_odometer']
+    fleetio_meter = post_meter_reading(state['fleetio_id'], mileage, last_meter)
+    if fleetio_meter is not None:
+        state_store.update(vehicle_id, fleetio_meter=fleetio_meter, **reading)
+    else:
+        # The Fleetio vehicle may be gone; rediscover it from scratch next run. Queued
+        # entries always succeed here; the outbox reports rejected ones to _outbox_write_dead.
+        state_store.forget(vehicle_id)
+
+
+def sync_vehicle(access_token, vehicle_id):
+    """
+    Syncs a single vehicle: fetches it from Smartcar, then updates Fleetio.
+    """
+    with metrics.stage('fetch'):
+        attributes, mileage = fetch_vehicle(access_token, vehicle_id)
+    if attributes is not None:
+        with metrics.stage('write'):
+            write_vehicle(vehicle_id, attributes, mileage)
+
+
+def write_vehicle(vehicle_id, attributes, mileage):
+    """
+    Writes one fetched vehicle to Fleetio and records the result in the state store.
+
+    Readings the odometer store rejects are logged and not posted. Returns
+    the Fleetio vehicle ID when a vehicle not yet in the state store was
+    found or created, otherwise None.
+    """
+    if mileage is not None and odometer_store is not None:
+        reason = odometer_store.record(vehicle_id, mileage)
+        if reason:
+            logger.warning("Rejected odometer reading of %.2f miles for vehicle ID %s: %s.", mileage, vehicle_id, reason)
+            mileage = None
+
+    state = state_store.get(vehicle_id) if state_store is not None else None
+    if state and state['fleetio_id'] and state['vin'] == attributes['vin']:
+        # Known vehicles only need their odometer, and only when it was read
+        if mileage is not None:
+            sync_known_vehicle(vehicle_id, state, mileage)
+        return None
+
+    vehicle_data = _vehicle_data(attributes, mileage)
+    fleetio_id, fleetio_meter = create_or_update_vehicle_in_fleetio(vehicle_data)
+    if fleetio_id and state_store is not None:
+        state_store.update(
+            vehicle_id,
+            vin=vehicle_data['vin'],
+            make=vehicle_data['make'],
+            model=vehicle_data['model'],
+            year=str(vehicle_data['year']),
+            fleetio_id=fleetio_id,
+            # What the next reading is compared with: Fleetio's meter, not this reading
+            fleetio_meter=fleetio_meter,
+            last_odometer=vehicle_data['mileage'],
+            last_odometer_at=time.time() if mileage is not None else None
+        )
+    return fleetio_id
+
+
+def record_odometer_reading(vehicle_id, mileage):
+    """
+    Writes an odometer reading that arrived without polling (a webhook delivery) to Fleetio.
+
+    Takes the same path as a polled reading; attributes come from the cache
+    and are fetched only for vehicles seen for the first time.
     """
     access_token = get_smartcar_access_token()
     if not access_token:
-        print("Failed to obtain Smartcar access token.")
+        logger.error("Failed to obtain Smartcar access token.")
         return
+    attributes = fetch_vehicle_attributes(access_token, vehicle_id)
+    if attributes is not None:
+        with metrics.stage('write'):
+            write_vehicle(vehicle_id, attributes, mileage)
 
-    vehicle_ids = get_vehicle_ids(access_token)
-    if not vehicle_ids:
-        print("No vehicles found in Smartcar account.")
-        return
 
-    for vehicle_id in vehicle_ids:
-        vehicle_data = fetch_vehicle_details(access_token, vehicle_id)
-        if vehicle_data:
-            create_or_update_vehicle_in_fleetio(vehicle_data)
+def sync_vehicles_concurrently(access_token, vehicle_ids, max_workers=SYNC_MAX_WORKERS):
+    """
+    Syncs vehicles as a streaming pipeline: vehicle IDs -> Smartcar fetch -> Fleetio write.
+
+    vehicle_ids may be any iterable, including the lazy iter_vehicle_ids()
+    listing. max_workers threads fetch from Smartcar and up to
+    FLEETIO_MAX_CONCURRENCY threads write to Fleetio, with bounded queues in
+    between, so the first meter entries are written while later pages are
+    still being listed and memory does not grow with the fleet. Each
+    vehicle is still fetched before it is written.
+    """
+    def fetch(vehicle_id):
+        with metrics.stage('fetch'):
+            attributes, mileage = fetch_vehicle(access_token, vehicle_id)
+        return (vehicle_id, attributes, mileage) if attributes is not None else None
+
+    def write(fetched):
+        with metrics.stage('write'):
+            write_vehicle(*fetched)
+
+    def report_error(item, error):
+        vehicle_id = item[0] if isinstance(item, tuple) else item
+        logger.error("Error syncing vehicle ID %s: %s", vehicle_id, error)
+
+    return run_pipeline(
+        vehicle_ids,
+        [(fetch, max_workers), (write, min(max_workers, FLEETIO_MAX_CONCURRENCY))],
+        queue_size=SYNC_QUEUE_SIZE,
+        on_error=report_error
+    )
+
+
+def _report_outbox(sent, failed):
+    counts = outbox.counts()
+    logger.info("Fleetio outbox: %d sent, %d failed, %d coalesced, %d pending, %d dead.",
+                sent, failed, outbox.coalesced, counts['pending'], counts['dead'])
+
+
+def report_vehicle_health():
+    """
+    Logs Smartcar latency by make, open circuit breakers and hedged reads since the last report.
+    """
+    for line in vehicle_health.report():
+        logger.info(line)
+    hedged, smartcar_client.hedged = smartcar_client.hedged, 0
+    hedge_wins, smartcar_client.hedge_wins = smartcar_client.hedge_wins, 0
+    if hedged:
+        logger.info("Hedged %d slow Smartcar reads; the hedge answered first %d times.", hedged, hedge_wins)
+
+
+def report_attribute_cache():
+    """
+    Logs the attribute cache hit ratio since the last report.
+    """
+    line = attribute_cache.report() if attribute_cache is not None else None
+    if line:
+        logger.info(line)
+
+
+def export_metrics():
+    """
+    Logs the request and stage timings gathered since the last export, writes the
+    configured metrics files and starts collecting afresh.
+    """
+    try:
+        metrics.export(METRICS_JSONL_PATH, METRICS_PROMETHEUS_PATH)
+    except OSError as e:
+        logger.error("Failed to write metrics: %s", e)
+
+
+def drain_outbox():
+    """
+    Sends every queued Fleetio write, without syncing any vehicles.
+
+    Writes held for coalescing are sent at once; retries wait for their backoff.
+    """
+    # The state store and Fleetio copy too, for meter entries rejected because the vehicle is gone
+    open_sync_resources()
+    try:
+        if outbox is None:
+            logger.warning("Fleetio outbox is disabled (FLEETIO_OUTBOX_PATH is empty).")
+            return
+        _report_outbox(*outbox.drain(fleetio_client, FLEETIO_MAX_CONCURRENCY, flush=True))
+    finally:
+        close_sync_resources()
+        export_metrics()
+
+
+def open_odometer_store():
+    """
+    Opens the odometer store, or returns None when it is disabled or NumPy is not installed.
+    """
+    if not ODOMETER_STORE_PATH:
+        return None
+    try:
+        from odometer_store import OdometerStore
+    except ImportError:
+        logger.warning("NumPy is not installed; odometer readings are neither kept nor checked locally.")
+        return None
+    return OdometerStore(ODOMETER_STORE_PATH, ODOMETER_MAX_SPEED)
+
+
+def open_sync_resources():
+    """
+    Opens the state store, attribute cache, outbox, odometer store and Fleetio vehicle copy used by sync cycles.
+    """
+    global state_store, attribute_cache, outbox, odometer_store, fleetio_cache
+    state_store = open_state_store(SYNC_STATE_PATH)
+    if state_store is not None:
+        attribute_cache = AttributeCache(state_store, ATTRIBUTE_CACHE_MAX_AGE)
+    outbox = open_outbox(FLEETIO_OUTBOX_PATH, on_dead=_outbox_write_dead)
+    odometer_store = open_odometer_store()
+    fleetio_cache = open_fleetio_cache(FLEETIO_INDEX_PATH, FLEETIO_INDEX_FULL_REFRESH)
+
+
+def close_sync_resources():
+    global state_store, attribute_cache, outbox, odometer_store, fleetio_cache
+    # Lookups made outside a sync cycle (e.g. onboarding)
+    report_attribute_cache()
+    if outbox is not None:
+        outbox.close()
+    if state_store is not None:
+        state_store.close()
+    if odometer_store is not None:
+        odometer_store.close()
+    if fleetio_cache is not None:
+        fleetio_cache.close()
+    state_store = attribute_cache = outbox = odometer_store = fleetio_cache = None
+    reset_fleetio_index()
+
+
+def vehicle_is_due(vehicle_id, poll_interval=0, poll_schedule=None):
+    """
+    True when a vehicle should be polled now: per poll_schedule (an
+    AdaptivePollSchedule) when given, else when it was not synced within the
+    last poll_interval seconds.
+    """
+    state = state_store.get(vehicle_id) if state_store is not None else None
+    if poll_schedule is not None:
+        return poll_schedule.is_due(state)
+    return not state or not state['last_sync'] or time.time() - state['last_sync'] >= poll_interval
+
+
+def sync_cycle(poll_interval=0, stop_event=None, poll_schedule=None):
+    """
+    Runs one sync of every listed vehicle, using the resources opened by open_sync_resources().
+
+    Vehicles that are not due (see vehicle_is_due) are skipped. Once
+    stop_event is set no further vehicles are started; those already
+    fetched are still written.
+
+    Returns a summary dict: vehicles listed and polled, outbox writes sent
+    and failed, and whether the whole listing was read. Returns None when
+    there is no Smartcar access token.
+    """
+    access_token = get_smartcar_access_token()
+    if not access_token:
+        logger.error("Failed to obtain Smartcar access token.")
+        return None
+
+    reset_fleetio_index()
+    if poll_schedule is not None and state_store is not None:
+        scale = poll_schedule.rebalance(state_store.values('odometer_rate'))
+        if scale > 1:
+            logger.warning("Polling demand exceeds the request budget; stretching poll intervals %.1fx.", scale)
+    checking_due = poll_interval or poll_schedule is not None
+
+    # Sends queued meter entries (including ones left over from earlier runs)
+    # while vehicles are still being fetched
+    drainer = OutboxDrainer(outbox, fleetio_client, FLEETIO_MAX_CONCURRENCY).start() if outbox else None
+
+    # Vehicles are synced as their listing page arrives; the IDs are kept to prune stale state afterwards
+    vehicle_ids = []
+    summary = {'listed': 0, 'polled': 0, 'sent': 0, 'failed': 0, 'complete': False}
+
+    def listed_vehicle_ids():
+        for vehicle_id in iter_vehicle_ids(access_token):
+            if stop_event is not None and stop_event.is_set():
+                return
+            vehicle_ids.append(vehicle_id)
+            if not checking_due or vehicle_is_due(vehicle_id, poll_interval, poll_schedule):
+                summary['polled'] += 1
+                yield vehicle_id
+
+    try:
+        try:
+            if SYNC_MAX_WORKERS > 1:
+                sync_vehicles_concurrently(access_token, listed_vehicle_ids())
+            else:
+                for vehicle_id in listed_vehicle_ids():
+                    # As in the pipeline, a vehicle that fails (say a Fleetio timeout) does not stop the rest
+                    try:
+                        sync_vehicle(access_token, vehicle_id)
+                    except Exception as e:
+                        logger.error("Error syncing vehicle ID %s: %s", vehicle_id, e)
+        except SmartcarError as e:
+            # Keep the state of vehicles that may be on the pages that could not be listed
+            logger.error("Failed to fetch vehicles from Smartcar: %s", e)
+        else:
+            if stop_event is not None and stop_event.is_set():
+                # A cut-short listing cannot tell which vehicles are gone, so nothing is pruned
+                logger.warning("Sync stopped before every vehicle was listed.")
+                return summary
+            summary['complete'] = True
+            if not vehicle_ids:
+                logger.warning("No vehicles found in Smartcar account.")
+            elif state_store is not None:
+                removed = state_store.prune(vehicle_ids)
+                if removed:
+                    logger.info("Dropped cached state for %d vehicles no longer in Smartcar.", removed)
+    finally:
+        summary['listed'] = len(vehicle_ids)
+        if drainer is not None:
+            summary['sent'], summary['failed'] = drainer.stop()
+            _report_outbox(summary['sent'], summary['failed'])
+        report_attribute_cache()
+        report_vehicle_health()
+        if odometer_store is not None:
+            # A daemon that dies later only replays this cycle's readings on restart
+            odometer_store.save()
+        export_metrics()
+    return summary
+
+
+def main():
+    """
+    Main function to execute the Smartcar to Fleetio data synchronization.
+
+    Returns the sync_cycle() summary.
+    """
+    open_sync_resources()
+    try:
+        return sync_cycle()
+    finally:
+        close_sync_resources()
+
+
+def cli(description="Sync Smartcar odometer readings to Fleetio."):
+    """
+    Command line entry point shared by smart_fetch.py and smart_fetch_sdk.py.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--drain-outbox', action='store_true',
+                        help="only send Fleetio writes queued by earlier runs, then exit")
+    args = parser.parse_args()
+    configure_logging()
+    if args.drain_outbox:
+        drain_outbox()
+    else:
+        main()
 
 
 if __name__ == "__main__":
-    main()
+    cli()
@@ -0,0 +1,169 @@
+"""
+Smartcar backends: how the sync engine (smart_fetch.py) talks to Smartcar.
+
+A backend answers the few questions the engine asks, whatever client it
+uses underneath:
+
+    refresh_token(refresh_token)  -> {'access_token', 'refresh_token', 'expires_in'} or None
+    authorize()                   -> the same, from an interactive OAuth flow, or None
+    iter_vehicle_ids(token, page_size) yields vehicle IDs, raises SmartcarError
+    fetch_attributes(token, id)   -> {'make', 'model', 'year', 'vin'} or None
+    fetch_odometer(token, id, hedge_after=None) -> miles or None
+    fetch_batch(token, id)        -> (attributes, miles) from one request; either may be None
+
+and carries a token_manager attribute, set by the engine, used to refresh a
+token Smartcar rejects. Per-vehicle failures are logged and returned as
+None; only listing failures raise. RestBackend is defined here;
+SdkBackend lives in smartcar_sdk_backend.py so the smartcar SDK is only
+imported when it is used.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+KM_PER_MILE = 1.60934
+
+
+class SmartcarError(Exception):
+    """
+    A Smartcar request failed; status is the HTTP status (or an SDK error code) and detail the response.
+    """
+
+    def __init__(self, status, detail):
+        super().__init__(f"{status} - {detail}")
+        self.status = status
+        self.detail = detail
+
+
+def odometer_miles(distance_km):
+    return distance_km / KM_PER_MILE
+
+
+class RestBackend:
+    """
+    Smartcar through its REST API, on the shared keep-alive SmartcarClient.
+
+    Requests are paced, timed and retried by the client's scheduler, a
+    slow GET can be hedged, and a 401 refreshes the token once through the
+    client's token manager.
+    """
+
+    name = 'rest'
+
+    def __init__(self, client, client_id, client_secret):
+        self.client = client
+        self.client_id = client_id
+        self.client_secret = client_secret
+
+    @property
+    def token_manager(self):
+        return self.client.token_manager
+
+    @token_manager.setter
+    def token_manager(self, token_manager):
+        self.client.token_manager = token_manager
+
+    def refresh_token(self, refresh_token):
+        """
+        Exchanges a refresh token for new Smartcar tokens. Returns the token response, or None.
+        """
+        response = self.client.post_token({
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+        })
+        if response.status_code == 200:
+            return response.json()
+        logger.error("Failed to refresh Smartcar token: %s - %s", response.status_code, response.text)
+        return None
+
+    def authorize(self):
+        # Tokens for the REST backend come from the credentials file only
+        return None
+
+    def iter_vehicle_ids(self, access_token, page_size):
+        """
+        Yields the vehicle IDs of the account, one /vehicles page (limit/offset) at a time.
+        """
+        offset = 0
+        while True:
+            response = self.client.get(
+                "/vehicles", access_token=access_token, params={'limit': page_size, 'offset': offset}
+            )
+            if response.status_code != 200:
+                raise SmartcarError(response.status_code, response.text)
+            data = response.json()
+            vehicle_ids = data.get('vehicles', [])
+            yield from vehicle_ids
+            offset += len(vehicle_ids)
+            total = (data.get('paging') or {}).get('count')
+            if len(vehicle_ids) < page_size or (total is not None and offset >= total):
+                return
+
+    def fetch_attributes(self, access_token, vehicle_id):
+        vehicle_response = self.client.get(f"/vehicles/{vehicle_id}", access_token=access_token)
+        if vehicle_response.status_code != 200:
+            logger.error("Failed to fetch vehicle data for ID %s: %s - %s",
+                         vehicle_id, vehicle_response.status_code, vehicle_response.text)
+            return None
+        vin_response = self.client.get(f"/vehicles/{vehicle_id}/vin", access_token=access_token)
+        if vin_response.status_code != 200:
+            logger.error("Failed to fetch VIN for vehicle ID %s: %s - %s",
+                         vehicle_id, vin_response.status_code, vin_response.text)
+            return None
+        return _attributes_from(vehicle_response.json(), vin_response.json())
+
+    def fetch_odometer(self, access_token, vehicle_id, hedge_after=None):
+        response = self.client.get(f"/vehicles/{vehicle_id}/odometer", access_token=access_token, hedge_after=hedge_after)
+        if response.status_code != 200:
+            logger.error("Failed to fetch odometer for vehicle ID %s: %s - %s",
+                         vehicle_id, response.status_code, response.text)
+            return None
+        return odometer_miles(response.json().get('distance', 0))
+
+    def fetch_batch(self, access_token, vehicle_id):
+        results = self.batch(access_token, vehicle_id, ['/', '/vin', '/odometer'])
+        if results is None or '/' not in results or '/vin' not in results:
+            return None, None
+        mileage = odometer_miles(results['/odometer'].get('distance', 0)) if '/odometer' in results else None
+        return _attributes_from(results['/'], results['/vin']), mileage
+
+    def batch(self, access_token, vehicle_id, paths):
+        """
+        Requests several Smartcar paths for one vehicle with a single batch call.
+
+        Returns a dict of path -> response body for the paths that succeeded;
+        each failed path is reported and left out. Returns None if the batch
+        request itself fails.
+        """
+        response = self.client.post(
+            f"/vehicles/{vehicle_id}/batch",
+            access_token=access_token,
+            json={'requests': [{'path': path} for path in paths]},
+            # A POST, but it only reads, so it is retried like a GET
+            idempotent=True
+        )
+        if response.status_code != 200:
+            logger.error("Failed batch request for vehicle ID %s: %s - %s", vehicle_id, response.status_code, response.text)
+            return None
+
+        results = {}
+        for path_response in response.json().get('responses', []):
+            path = path_response.get('path')
+            if path_response.get('code') == 200:
+                results[path] = path_response.get('body') or {}
+            else:
+                logger.error("Failed to fetch %s for vehicle ID %s in batch: %s - %s",
+                             path, vehicle_id, path_response.get('code'), path_response.get('body'))
+        return results
+
+
+def _attributes_from(vehicle_data, vin_data):
+    return {
+        'make': vehicle_data.get('make', 'Unknown Make'),
+        'model': vehicle_data.get('model', 'Unknown Model'),
+        'year': vehicle_data.get('year', 'Unknown Year'),
+        'vin': vin_data.get('vin')
+    }
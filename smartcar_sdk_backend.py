@@ -0,0 +1,194 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+import requests
+import smartcar
+
+from smartcar_backends import SmartcarError, odometer_miles
+
+logger = logging.getLogger(__name__)
+
+SCOPE = ['read_vehicle_info', 'read_odometer', 'read_vin']
+
+
+class SdkBackend:
+    """
+    Smartcar through the smartcar Python SDK (see smartcar_backends for the interface).
+
+    Every SDK call runs under the Smartcar rate limiter, which waits out and
+    retries 429s, and is recorded in the run metrics (the SDK exposes no
+    response sizes). A call Smartcar answers with 401 is retried once with a
+    refreshed token. The SDK cannot hedge reads, so hedge_after is ignored.
+
+    The SDK waits up to 310 seconds for every response, so timeout is
+    enforced here: a call still unanswered after `timeout` seconds raises
+    requests.Timeout, as the REST client would, and is left to finish on
+    its own thread.
+    """
+
+    name = 'sdk'
+
+    def __init__(self, client_id, client_secret, redirect_uri, scheduler, metrics, timeout=None):
+        self.scheduler = scheduler
+        self.metrics = metrics
+        self.timeout = timeout
+        self.token_manager = None
+        self.client = smartcar.AuthClient(
+            client_id=client_id,
+            client_secret=client_secret,
+            redirect_uri=redirect_uri,
+            test_mode=False  # Set to True if using Smartcar test mode
+        )
+
+    def _call(self, func, endpoint, method='GET'):
+        attempts, on_wire = 0, 0.0
+
+        def timed():
+            nonlocal attempts, on_wire
+            attempts += 1
+            started = time.perf_counter()
+            try:
+                return self._within_timeout(func)
+            finally:
+                on_wire += time.perf_counter() - started
+
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            result = self.scheduler.call(
+                timed,
+                is_rate_limited=lambda e: isinstance(e, smartcar.SmartcarException) and getattr(e, 'status_code', None) == 429,
+                retry_after=lambda e: getattr(e, 'retry_after', None)
+            )
+            status = 200
+            return result
+        except smartcar.SmartcarException as e:
+            status = getattr(e, 'status_code', None) or 'error'
+            raise
+        finally:
+            self.metrics.record_request('smartcar', method, endpoint, status, on_wire,
+                                        wait=time.perf_counter() - started - on_wire, retries=max(0, attempts - 1))
+
+    def _within_timeout(self, func):
+        if not self.timeout:
+            return func()
+        result = Future()
+
+        def run():
+            try:
+                result.set_result(func())
+            except BaseException as e:
+                result.set_exception(e)
+
+        threading.Thread(target=run, daemon=True, name='smartcar-sdk-call').start()
+        try:
+            return result.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise requests.Timeout(f"No response from Smartcar within {self.timeout:g}s") from None
+
+    def _authorized(self, access_token, func, endpoint, method='GET'):
+        # Run func(token); if Smartcar rejects the token, refresh it once and retry
+        try:
+            return self._call(lambda: func(access_token), endpoint, method)
+        except smartcar.SmartcarException as e:
+            if getattr(e, 'status_code', None) != 401 or self.token_manager is None:
+                raise
+            fresh_token = self.token_manager.invalidate(access_token)
+            if not fresh_token or fresh_token == access_token:
+                raise
+            return self._call(lambda: func(fresh_token), endpoint, method)
+
+    def refresh_token(self, refresh_token):
+        try:
+            access = self._call(lambda: self.client.exchange_refresh_token(refresh_token), '/oauth/token', 'POST')
+        except smartcar.SmartcarException as e:
+            logger.error("Failed to refresh Smartcar token: Code: %s, Message: %s", getattr(e, 'code', None), e.message)
+            return None
+        return {'access_token': access.access_token, 'refresh_token': access.refresh_token, 'expires_in': access.expires_in}
+
+    def authorize(self):
+        """
+        Runs the OAuth flow in the terminal: prints the Smartcar Connect URL and exchanges the code pasted back.
+        """
+        print("Go to the following URL to authorize access:")
+        print(self.client.get_auth_url(scope=SCOPE))
+        authorization_code = input("Enter the authorization code from the URL: ")
+        try:
+            access = self._call(lambda: self.client.exchange_code(authorization_code), '/oauth/token', 'POST')
+        except smartcar.SmartcarException as e:
+            logger.error("Error obtaining access token: Code: %s, Message: %s", getattr(e, 'code', None), e.message)
+            return None
+        return {'access_token': access.access_token, 'refresh_token': access.refresh_token, 'expires_in': access.expires_in}
+
+    def iter_vehicle_ids(self, access_token, page_size):
+        offset = 0
+        while True:
+            paging = {'limit': page_size, 'offset': offset}
+            try:
+                response = self._authorized(
+                    access_token, lambda token: smartcar.get_vehicles(token, paging=paging), '/vehicles'
+                )
+            except smartcar.SmartcarException as e:
+                raise SmartcarError(getattr(e, 'status_code', None) or getattr(e, 'code', None), e.message) from e
+            yield from response.vehicles
+            offset += len(response.vehicles)
+            if len(response.vehicles) < page_size or offset >= response.paging.count:
+                return
+
+    def fetch_attributes(self, access_token, vehicle_id):
+        try:
+            info = self._authorized(access_token, lambda token: smartcar.Vehicle(vehicle_id, token).attributes(),
+                                    '/vehicles/{id}')
+            vin_info = self._authorized(access_token, lambda token: smartcar.Vehicle(vehicle_id, token).vin(),
+                                        '/vehicles/{id}/vin')
+        except smartcar.SmartcarException as e:
+            logger.error("Failed to fetch vehicle data for ID %s: Code: %s, Message: %s",
+                         vehicle_id, getattr(e, 'code', None), e.message)
+            return None
+        return _attributes_from(info, vin_info)
+
+    def fetch_odometer(self, access_token, vehicle_id, hedge_after=None):
+        try:
+            odometer = self._authorized(access_token, lambda token: smartcar.Vehicle(vehicle_id, token).odometer(),
+                                        '/vehicles/{id}/odometer')
+        except smartcar.SmartcarException as e:
+            logger.error("Failed to fetch odometer for vehicle ID %s: Code: %s, Message: %s",
+                         vehicle_id, getattr(e, 'code', None), e.message)
+            return None
+        return odometer_miles(odometer.distance)
+
+    def fetch_batch(self, access_token, vehicle_id):
+        try:
+            batch = self._authorized(
+                access_token, lambda token: smartcar.Vehicle(vehicle_id, token).batch(['/', '/vin', '/odometer']),
+                '/vehicles/{id}/batch', 'POST'
+            )
+        except smartcar.SmartcarException as e:
+            logger.error("Failed batch request for vehicle ID %s: Code: %s, Message: %s",
+                         vehicle_id, getattr(e, 'code', None), e.message)
+            return None, None
+        # Each path succeeds or fails on its own; its accessor raises on failure
+        try:
+            attributes = _attributes_from(batch.attributes(), batch.vin())
+        except smartcar.SmartcarException as e:
+            logger.error("Failed to fetch vehicle data for ID %s in batch: Code: %s, Message: %s",
+                         vehicle_id, getattr(e, 'code', None), e.message)
+            return None, None
+        try:
+            mileage = odometer_miles(batch.odometer().distance)
+        except smartcar.SmartcarException as e:
+            logger.error("Failed to fetch odometer for vehicle ID %s in batch: Code: %s, Message: %s",
+                         vehicle_id, getattr(e, 'code', None), e.message)
+            mileage = None
+        return attributes, mileage
+
+
+def _attributes_from(info, vin_info):
+    return {
+        'make': info.make or 'Unknown Make',
+        'model': info.model or 'Unknown Model',
+        'year': str(info.year) if info.year else 'Unknown Year',
+        'vin': vin_info.vin or None
+    }
@@ -0,0 +1,136 @@
+import sqlite3
+import threading
+import time
+
+STATE_FIELDS = (
+    'vin', 'make', 'model', 'year', 'fleetio_id', 'last_odometer', 'last_sync', 'attributes_cached_at',
+    'last_odometer_at', 'odometer_rate', 'fleetio_meter'
+)
+# Columns added after the first release, created on open when missing
+ADDED_COLUMNS = (
+    ('attributes_cached_at', 'REAL'),
+    ('last_odometer_at', 'REAL'),
+    ('odometer_rate', 'REAL'),
+    ('fleetio_meter', 'REAL'),
+)
+
+
+class SyncStateStore:
+    """
+    Persistent per-vehicle sync state, keyed by Smartcar vehicle ID.
+
+    Remembers each vehicle's VIN, make/model/year, Fleetio ID, last posted
+    odometer reading and last sync time, so later runs can fetch only the
+    odometer for known vehicles and skip Fleetio writes when nothing changed.
+    The time of the last reading and the odometer rate drive adaptive polling;
+    fleetio_meter is the meter value last written to (or found in) Fleetio.
+    Safe to share between worker threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS vehicles (
+                    smartcar_id TEXT PRIMARY KEY,
+                    vin TEXT,
+                    make TEXT,
+                    model TEXT,
+                    year TEXT,
+                    fleetio_id INTEGER,
+                    last_odometer REAL,
+                    last_sync REAL
+                )
+                """
+            )
+            columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(vehicles)")}
+            for column, column_type in ADDED_COLUMNS:
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE vehicles ADD COLUMN {column} {column_type}")
+
+    def get(self, smartcar_id):
+        """
+        Returns the stored state for a vehicle as a dict, or None if it is unknown.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM vehicles WHERE smartcar_id = ?", (smartcar_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def update(self, smartcar_id, **fields):
+        """
+        Inserts or updates a vehicle's state; last_sync defaults to now.
+        """
+        unknown = set(fields) - set(STATE_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown state fields: {', '.join(sorted(unknown))}")
+        fields.setdefault('last_sync', time.time())
+        columns = ', '.join(fields)
+        placeholders = ', '.join('?' for _ in fields)
+        assignments = ', '.join(f"{column} = excluded.{column}" for column in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO vehicles (smartcar_id, {columns}) VALUES (?, {placeholders}) "
+                f"ON CONFLICT(smartcar_id) DO UPDATE SET {assignments}",
+                (smartcar_id, *fields.values())
+            )
+
+    def values(self, field):
+        """
+        Returns one field's value for every stored vehicle.
+        """
+        if field not in STATE_FIELDS:
+            raise ValueError(f"Unknown state field: {field}")
+        with self._lock:
+            return [row[0] for row in self._conn.execute(f"SELECT {field} FROM vehicles")]
+
+    def forget(self, smartcar_id):
+        """
+        Drops a vehicle's state so the next run treats it as new.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM vehicles WHERE smartcar_id = ?", (smartcar_id,))
+
+    def forget_fleetio_vehicle(self, fleetio_id):
+        """
+        Unlinks every vehicle from a Fleetio vehicle that no longer takes writes, so the
+        next run looks its VIN up again. Other state, such as cached attributes, is kept.
+
+        Returns the number of vehicles unlinked.
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE vehicles SET fleetio_id = NULL, fleetio_meter = NULL WHERE fleetio_id = ?", (fleetio_id,)
+            )
+        return cursor.rowcount
+
+    def prune(self, keep_ids):
+        """
+        Drops every vehicle not in keep_ids (vehicles that disappeared from Smartcar).
+
+        Returns the number of vehicles removed.
+        """
+        keep_ids = set(keep_ids)
+        with self._lock, self._conn:
+            stored = [row[0] for row in self._conn.execute("SELECT smartcar_id FROM vehicles")]
+            gone = [smartcar_id for smartcar_id in stored if smartcar_id not in keep_ids]
+            self._conn.executemany("DELETE FROM vehicles WHERE smartcar_id = ?", [(g,) for g in gone])
+        return len(gone)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_state_store(path):
+    """
+    Opens the state store at path, or returns None when path is empty (state disabled).
+    """
+    if not path:
+        return None
+    return SyncStateStore(path)
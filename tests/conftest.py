@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+from stub_server import StubState, configure_environment, start_stub_server  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def stub(tmp_path_factory):
+    """
+    The stub Smartcar/Fleetio server, in this process so tests can inspect and change its state.
+
+    The environment points smart_fetch at it, so import smart_fetch only inside tests.
+    """
+    state = StubState(fleet_size=10, latency=0, seed=0)
+    server, base_url = start_stub_server(state)
+    configure_environment(base_url)
+    # Token refreshes must not touch a real .env
+    os.environ['CREDENTIALS_PATH'] = str(tmp_path_factory.mktemp('credentials') / '.env')
+    yield state, base_url
+    server.shutdown()
+
+
+@pytest.fixture
+def fleetio(stub):
+    """
+    Empties the stub's Fleetio account and returns the stub state.
+    """
+    state, _ = stub
+    state.reset_fleetio()
+    return state
+
+
+@pytest.fixture
+def sync(stub, tmp_path, monkeypatch):
+    """
+    smart_fetch with its state store, outbox and Fleetio index in tmp_path; closed afterwards.
+    """
+    import smart_fetch
+
+    monkeypatch.setattr(smart_fetch, 'SYNC_STATE_PATH', str(tmp_path / 'state.db'))
+    monkeypatch.setattr(smart_fetch, 'FLEETIO_OUTBOX_PATH', str(tmp_path / 'outbox.db'))
+    monkeypatch.setattr(smart_fetch, 'FLEETIO_INDEX_PATH', str(tmp_path / 'vehicles.db'))
+    monkeypatch.setattr(smart_fetch, 'ODOMETER_STORE_PATH', '')
+    smart_fetch.open_sync_resources()
+    yield smart_fetch
+    smart_fetch.close_sync_resources()
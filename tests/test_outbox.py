@@ -0,0 +1,44 @@
+import threading
+
+from clients import FleetioClient
+from outbox import FleetioOutbox
+
+
+def test_two_outboxes_on_one_file_send_each_entry_once(fleetio, stub, tmp_path):
+    _, base_url = stub
+    vehicle = fleetio.create_fleetio_vehicle({'vin': 'OUTBOXVIN00000001', 'name': 'Outbox test'})
+    path = str(tmp_path / 'outbox.db')
+    # Two instances stand in for the sync daemon and the webhook receiver
+    outboxes = [FleetioOutbox(path), FleetioOutbox(path)]
+    for value in range(20):
+        outboxes[0].enqueue('POST', '/meter_entries', {'vehicle_id': vehicle['id'], 'value': 1000 + value})
+
+    client = FleetioClient('token', 'account', f"{base_url}/api/v1")
+    start = threading.Barrier(len(outboxes))
+
+    def drain(outbox):
+        start.wait()
+        outbox.drain(client, max_workers=4, batch_size=5)
+
+    threads = [threading.Thread(target=drain, args=(outbox,)) for outbox in outboxes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    values = sorted(entry['value'] for entry in fleetio.meter_entries)
+    assert values == [1000 + value for value in range(20)]
+    assert outboxes[1].counts() == {'pending': 0, 'dead': 0}
+    for outbox in outboxes:
+        outbox.close()
+
+
+def test_claimed_entries_are_not_due_until_the_lease_ends(tmp_path):
+    path = str(tmp_path / 'outbox.db')
+    first, second = FleetioOutbox(path), FleetioOutbox(path, lease=0)
+    first.enqueue('POST', '/meter_entries', {'vehicle_id': 1, 'value': 10})
+
+    assert len(first.claim()) == 1
+    assert second.due() == [] and second.claim() == []
+    first.close()
+    second.close()
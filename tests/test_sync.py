@@ -0,0 +1,56 @@
+import pytest
+
+ATTRIBUTES = {'make': 'TESLA', 'model': 'Model 3', 'year': 2020, 'vin': 'SYNCTESTVIN000001'}
+
+
+@pytest.fixture
+def direct(sync, monkeypatch):
+    # Meter entries posted at once, so the stub shows them without draining an outbox
+    sync.close_sync_resources()
+    monkeypatch.setattr(sync, 'FLEETIO_OUTBOX_PATH', '')
+    sync.open_sync_resources()
+    return sync
+
+
+def test_reading_below_fleetio_meter_is_compared_with_fleetio_next_time(direct, fleetio):
+    fleetio.create_fleetio_vehicle({'vin': ATTRIBUTES['vin'], 'current_meter_value': 50000})
+
+    direct.write_vehicle('sc-test', ATTRIBUTES, 49000)
+    assert direct.state_store.get('sc-test')['fleetio_meter'] == 50000
+    # Still below Fleetio's meter, though above the first reading
+    direct.write_vehicle('sc-test', ATTRIBUTES, 49010)
+
+    assert fleetio.meter_entries == []
+    assert direct.state_store.get('sc-test')['fleetio_meter'] == 50000
+
+
+def test_first_fetch_without_mileage_keeps_fleetio_meter(direct, fleetio):
+    fleetio.create_fleetio_vehicle({'vin': ATTRIBUTES['vin'], 'current_meter_value': 50000})
+
+    direct.write_vehicle('sc-test', ATTRIBUTES, None)
+    # Above Fleetio, but by less than METER_MIN_DELTA
+    direct.write_vehicle('sc-test', ATTRIBUTES, 50000 + direct.METER_MIN_DELTA / 2)
+
+    assert fleetio.meter_entries == []
+
+
+def test_queued_entry_for_deleted_vehicle_leads_to_fresh_lookup(sync, fleetio):
+    gone = fleetio.create_fleetio_vehicle({'vin': ATTRIBUTES['vin'], 'current_meter_value': 1000})
+    sync.write_vehicle('sc-test', ATTRIBUTES, 1000)
+    assert sync.state_store.get('sc-test')['fleetio_id'] == gone['id']
+
+    # Deleted in Fleetio: entries for it are rejected with 422
+    with fleetio.lock:
+        del fleetio.fleetio_vehicles[gone['id']]
+        del fleetio.fleetio_by_vin[ATTRIBUTES['vin']]
+        fleetio.fleetio_order.remove(gone)
+    sync.write_vehicle('sc-test', ATTRIBUTES, 2000)
+    sync.outbox.drain(sync.fleetio_client, flush=True)
+
+    assert sync.outbox.counts()['dead'] == 1
+    assert sync.state_store.get('sc-test')['fleetio_id'] is None
+
+    sync.write_vehicle('sc-test', ATTRIBUTES, 3000)
+    created = fleetio.fleetio_by_vin[ATTRIBUTES['vin']]
+    assert created['id'] != gone['id']
+    assert sync.state_store.get('sc-test')['fleetio_id'] == created['id']
@@ -0,0 +1,118 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Refresh this many seconds before the access token expires
+DEFAULT_REFRESH_MARGIN = 300
+
+
+class TokenManager:
+    """
+    Holds the Smartcar access and refresh tokens for one account and keeps them fresh.
+
+    The expiry from the OAuth response (expires_in) is tracked, so the access
+    token is refreshed shortly before it expires instead of being checked
+    with an API request. Refreshes are single-flight: concurrent callers
+    wait for the one refresh in progress and share its result, so the
+    refresh token, which Smartcar rotates on every use, is only spent once.
+
+    `refresh(refresh_token)` performs the grant and returns a dict with
+    access_token, refresh_token and expires_in, or None on failure.
+
+    With a CredentialStore, tokens are persisted under `keys` (access,
+    refresh and expires-at names), and each refresh runs under the store's
+    lock after re-reading it, so a token already rotated by another process
+    is adopted instead of refreshed again. Safe to share between threads.
+    """
+
+    def __init__(self, refresh, access_token=None, refresh_token=None, expires_at=None,
+                 store=None, keys=None, margin=DEFAULT_REFRESH_MARGIN):
+        self._refresh = refresh
+        self._store = store
+        self._keys = keys
+        self.margin = margin
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        # None means unknown (tokens from before expiry was tracked): trusted until rejected
+        self.expires_at = expires_at
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_store(cls, refresh, store, keys, margin=DEFAULT_REFRESH_MARGIN):
+        """
+        Creates a manager with the tokens currently saved in store under keys.
+        """
+        manager = cls(refresh, store=store, keys=keys, margin=margin)
+        manager._adopt({key: store.get(key) for key in keys})
+        return manager
+
+    def _adopt(self, values):
+        access_key, refresh_key, expires_key = self._keys
+        self.access_token = values.get(access_key) or None
+        self.refresh_token = values.get(refresh_key) or None
+        expires_at = values.get(expires_key)
+        self.expires_at = float(expires_at) if expires_at else None
+
+    def _expiring(self):
+        return self.expires_at is not None and time.time() >= self.expires_at - self.margin
+
+    def _usable(self, rejected_token):
+        return self.access_token and self.access_token != rejected_token and not self._expiring()
+
+    def _grant(self):
+        if not self.refresh_token:
+            logger.error("Access token expired and no refresh token available.")
+            return None
+        tokens = self._refresh(self.refresh_token)
+        if not tokens:
+            return None
+        self.access_token = tokens['access_token']
+        self.refresh_token = tokens.get('refresh_token') or self.refresh_token
+        expires_in = tokens.get('expires_in')
+        self.expires_at = time.time() + float(expires_in) if expires_in else None
+        return self.access_token
+
+    def _refresh_locked(self, rejected_token=None):
+        if self._store is None:
+            return self._grant()
+        with self._store.locked():
+            stored = self._store.reload()
+            access_key, refresh_key, expires_key = self._keys
+            if stored.get(refresh_key) and stored.get(refresh_key) != self.refresh_token:
+                # Another process rotated the tokens since they were loaded
+                self._adopt(stored)
+                if self._usable(rejected_token):
+                    return self.access_token
+            if not self._grant():
+                return None
+            self._store.update({
+                access_key: self.access_token,
+                refresh_key: self.refresh_token,
+                expires_key: f"{self.expires_at:.0f}" if self.expires_at else ''
+            })
+            return self.access_token
+
+    def get(self):
+        """
+        Returns a usable access token, refreshing it first if it is about to expire.
+
+        Returns None when there is no token and it cannot be refreshed.
+        """
+        with self._lock:
+            if self._usable(None):
+                return self.access_token
+            return self._refresh_locked()
+
+    def invalidate(self, rejected_token):
+        """
+        Reports that the API rejected rejected_token (HTTP 401) and returns the token to retry with.
+
+        Only the first report for a token refreshes it; later reports for the
+        same token get the already refreshed one.
+        """
+        with self._lock:
+            if self.access_token and self.access_token != rejected_token:
+                return self.access_token
+            return self._refresh_locked(rejected_token)
@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import deque
+
+from metrics import percentile
+
+
+class CircuitBreaker:
+    """
+    Per-key circuit breakers: a key that fails `threshold` times in a row is
+    skipped for `cooldown` seconds.
+
+    After the cooldown the key is let through again; one more failure opens
+    it again at once, a success closes it.
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = {}
+        self._open_until = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        with self._lock:
+            return time.monotonic() >= self._open_until.get(key, 0.0)
+
+    def record(self, key, ok):
+        """
+        Records an outcome for key; returns True when this failure opened the breaker.
+        """
+        with self._lock:
+            if ok:
+                self._failures.pop(key, None)
+                self._open_until.pop(key, None)
+                return False
+            failures = self._failures.get(key, 0) + 1
+            self._failures[key] = failures
+            # A key let through after its cooldown reopens on its first failure
+            if failures >= self.threshold and time.monotonic() >= self._open_until.get(key, 0.0):
+                self._open_until[key] = time.monotonic() + self.cooldown
+                return True
+            return False
+
+    def open_keys(self):
+        now = time.monotonic()
+        with self._lock:
+            return sorted(key for key, until in self._open_until.items() if until > now)
+
+
+class VehicleHealth:
+    """
+    Smartcar latency by vehicle make, and circuit breakers for makes and vehicles.
+
+    OEM backends differ widely in speed, so odometer latencies are kept in
+    a rolling window per make; its p95 (once `min_samples` are in) is the
+    delay after which a slow read may be hedged. Makes and vehicles that
+    keep failing are skipped for a cooldown so they cannot hold up the
+    rest of the fleet. State lives for the process, so a daemon carries it
+    from one cycle to the next.
+    """
+
+    def __init__(self, make_failures=5, vehicle_failures=3, cooldown=900, window=200, min_samples=20,
+                 hedge_quantile=0.95):
+        self.makes = CircuitBreaker(make_failures, cooldown)
+        self.vehicles = CircuitBreaker(vehicle_failures, cooldown)
+        self.window = window
+        self.min_samples = min_samples
+        self.hedge_quantile = hedge_quantile
+        self.skipped = 0
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def skip_reason(self, vehicle_id, make=None):
+        """
+        Returns why a vehicle should not be fetched now, or None.
+        """
+        reason = None
+        if make and not self.makes.allow(make):
+            reason = f"circuit open for make {make}"
+        elif not self.vehicles.allow(vehicle_id):
+            reason = "circuit open for vehicle"
+        if reason:
+            with self._lock:
+                self.skipped += 1
+        return reason
+
+    def record(self, vehicle_id, make, ok):
+        """
+        Records a vehicle fetch outcome; returns the breakers it opened ('make', 'vehicle').
+        """
+        opened = []
+        if make and self.makes.record(make, ok):
+            opened.append('make')
+        if self.vehicles.record(vehicle_id, ok):
+            opened.append('vehicle')
+        return opened
+
+    def record_latency(self, make, seconds):
+        with self._lock:
+            latencies = self._latencies.get(make)
+            if latencies is None:
+                latencies = self._latencies[make] = deque(maxlen=self.window)
+            latencies.append(seconds)
+
+    def latency(self, make, fraction):
+        """
+        The given percentile of a make's recent latencies, or None before min_samples.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies.get(make) or ())
+        if len(latencies) < self.min_samples:
+            return None
+        return percentile(latencies, fraction)
+
+    def hedge_delay(self, make):
+        """
+        Seconds after which a read for this make has taken longer than usual and may be hedged.
+        """
+        return self.latency(make, self.hedge_quantile) if make else None
+
+    def report(self):
+        """
+        Returns one summary line per make, then the open circuits and the fetches skipped since the last report.
+        """
+        with self._lock:
+            makes = {make: sorted(latencies) for make, latencies in self._latencies.items()}
+        lines = [
+            f"Smartcar {make}: p50 {percentile(latencies, 0.5):.2f}s, p95 {percentile(latencies, 0.95):.2f}s "
+            f"over the last {len(latencies)} odometer reads."
+            for make, latencies in sorted(makes.items()) if latencies
+        ]
+        open_makes, open_vehicles = self.makes.open_keys(), self.vehicles.open_keys()
+        with self._lock:
+            skipped, self.skipped = self.skipped, 0
+        if open_makes or open_vehicles or skipped:
+            lines.append(f"Circuit breakers open for makes: {', '.join(open_makes) or 'none'}; "
+                         f"for vehicles: {len(open_vehicles)}. {skipped} fetches skipped.")
+        return lines
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Receives Smartcar webhook deliveries and writes their odometer readings to Fleetio.
+
+    python webhook_receiver.py serve [--host 127.0.0.1] [--port 8000] [--record deliveries.jsonl]
+    python webhook_receiver.py replay deliveries.jsonl [--url http://127.0.0.1:8000/]
+
+Deliveries are verified against SMARTCAR_MANAGEMENT_TOKEN (the SC-Signature
+header is an HMAC-SHA256 of the raw body, as in smartcar.verify_payload),
+deduplicated by vehicle and request ID, acknowledged at once and then fed
+through smart_fetch's usual meter entry path on worker threads. Vehicles
+that report this way count as freshly polled, so a sync daemon running
+against the same state store only polls the ones that stay silent.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import signal
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+from logging_config import configure_logging
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+SMARTCAR_MANAGEMENT_TOKEN = os.getenv("SMARTCAR_MANAGEMENT_TOKEN")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8000"))
+# Readings written to Fleetio at once
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+# Deliveries remembered for deduplication
+WEBHOOK_DEDUPE_SIZE = int(os.getenv("WEBHOOK_DEDUPE_SIZE", "10000"))
+MAX_BODY_SIZE = 1024 * 1024
+
+REASONS = {200: 'OK', 400: 'Bad Request', 401: 'Unauthorized', 404: 'Not Found',
+           405: 'Method Not Allowed', 413: 'Payload Too Large'}
+
+
+def hash_challenge(management_token, message):
+    """
+    HMAC-SHA256 hex digest of message keyed with the application management token.
+    """
+    return hmac.new(management_token.encode(), message.encode(), hashlib.sha256).hexdigest()
+
+
+def verify_signature(management_token, signature, body):
+    return bool(signature) and hmac.compare_digest(hash_challenge(management_token, body), signature)
+
+
+def odometer_readings(delivery):
+    """
+    Yields (vehicle_id, request_id, miles) for every successful /odometer result in a delivery.
+    """
+    for vehicle in (delivery.get('payload') or {}).get('vehicles', []):
+        for result in vehicle.get('data', []):
+            if result.get('path') != '/odometer' or result.get('code', 200) != 200:
+                continue
+            distance = (result.get('body') or {}).get('distance')
+            if distance is None:
+                continue
+            headers = {key.lower(): value for key, value in (result.get('headers') or {}).items()}
+            miles = distance if headers.get('sc-unit-system') == 'imperial' else distance / 1.60934
+            yield vehicle.get('vehicleId'), vehicle.get('requestId'), miles
+
+
+class WebhookReceiver:
+    """
+    Minimal asyncio HTTP server for Smartcar webhook deliveries.
+
+    `write_reading(vehicle_id, miles)` is called on a worker thread for each
+    new reading; at most `workers` run at once.
+    """
+
+    def __init__(self, management_token, write_reading, workers=WEBHOOK_WORKERS,
+                 dedupe_size=WEBHOOK_DEDUPE_SIZE, record_path=None):
+        self.management_token = management_token
+        self.write_reading = write_reading
+        self.workers = workers
+        self.dedupe_size = dedupe_size
+        self.record_path = record_path
+        self.received = self.duplicates = self.rejected = self.written = 0
+        self._seen = OrderedDict()
+        self._queue = None
+
+    def _is_duplicate(self, key):
+        if key in self._seen:
+            self._seen.move_to_end(key)
+            return True
+        self._seen[key] = True
+        if len(self._seen) > self.dedupe_size:
+            self._seen.popitem(last=False)
+        return False
+
+    def _record(self, headers, body):
+        with open(self.record_path, 'a') as record_file:
+            record_file.write(json.dumps({
+                'received_at': time.time(),
+                'headers': {'sc-signature': headers.get('sc-signature', '')},
+                'body': body
+            }) + "\n")
+
+    def handle_delivery(self, headers, body):
+        """
+        Verifies and queues one delivery; returns (status, response body).
+        """
+        if not verify_signature(self.management_token, headers.get('sc-signature'), body):
+            self.rejected += 1
+            return 401, {'error': 'invalid signature'}
+        try:
+            delivery = json.loads(body)
+        except ValueError:
+            return 400, {'error': 'invalid JSON'}
+        if self.record_path:
+            self._record(headers, body)
+
+        if delivery.get('eventName') == 'verify':
+            challenge = (delivery.get('payload') or {}).get('challenge', '')
+            return 200, {'challenge': hash_challenge(self.management_token, challenge)}
+
+        for vehicle_id, request_id, miles in odometer_readings(delivery):
+            self.received += 1
+            if self._is_duplicate((vehicle_id, request_id or round(miles, 2))):
+                self.duplicates += 1
+                continue
+            self._queue.put_nowait((vehicle_id, miles))
+        return 200, {'status': 'accepted'}
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            method, path, _ = request_line.decode('latin-1').split(' ', 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length') or 0)
+            if length > MAX_BODY_SIZE:
+                status, response = 413, {'error': 'body too large'}
+            elif method != 'POST':
+                status, response = 405, {'error': 'POST only'}
+            else:
+                body = (await reader.readexactly(length)).decode() if length else ''
+                status, response = self.handle_delivery(headers, body)
+        except (ValueError, asyncio.IncompleteReadError):
+            status, response = 400, {'error': 'malformed request'}
+
+        data = json.dumps(response).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode() + data
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _work(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            vehicle_id, miles = await self._queue.get()
+            try:
+                await loop.run_in_executor(None, self.write_reading, vehicle_id, miles)
+                self.written += 1
+            except Exception as e:
+                logger.error("Error writing webhook reading for vehicle ID %s: %s", vehicle_id, e)
+            finally:
+                self._queue.task_done()
+
+    async def serve(self, host, port, stop_event):
+        """
+        Serves until stop_event is set, then finishes the queued readings.
+        """
+        self._queue = asyncio.Queue()
+        workers = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        logger.info("Listening for Smartcar webhooks on http://%s:%s/", host, port)
+        async with server:
+            await stop_event.wait()
+        await self._queue.join()
+        for worker in workers:
+            worker.cancel()
+        logger.info("Webhook receiver: %d readings, %d duplicates, %d written, %d rejected deliveries.",
+                    self.received, self.duplicates, self.written, self.rejected)
+
+
+def serve(host, port, record_path=None):
+    import smart_fetch
+    from outbox import OutboxDrainer
+
+    if not SMARTCAR_MANAGEMENT_TOKEN:
+        logger.error("SMARTCAR_MANAGEMENT_TOKEN is required to verify webhook signatures.")
+        return
+
+    smart_fetch.open_sync_resources()
+    drainer = None
+    if smart_fetch.outbox is not None:
+        drainer = OutboxDrainer(
+            smart_fetch.outbox, smart_fetch.fleetio_client, smart_fetch.FLEETIO_MAX_CONCURRENCY
+        ).start()
+    receiver = WebhookReceiver(
+        SMARTCAR_MANAGEMENT_TOKEN, smart_fetch.record_odometer_reading, record_path=record_path
+    )
+
+    async def run():
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stop_event.set)
+        await receiver.serve(host, port, stop_event)
+
+    try:
+        asyncio.run(run())
+    finally:
+        if drainer is not None:
+            smart_fetch._report_outbox(*drainer.stop())
+        smart_fetch.export_metrics()
+        smart_fetch.close_sync_resources()
+
+
+def replay(path, url):
+    """
+    Posts recorded deliveries (one JSON object per line) to a running receiver.
+
+    Lines written by --record are sent with their original signature. Any
+    other line is taken as a delivery body and signed with
+    SMARTCAR_MANAGEMENT_TOKEN.
+    """
+    import requests
+
+    with open(path) as deliveries:
+        for number, line in enumerate(deliveries, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if 'body' in entry and 'headers' in entry:
+                body, signature = entry['body'], entry['headers'].get('sc-signature', '')
+            else:
+                body = json.dumps(entry)
+                signature = hash_challenge(SMARTCAR_MANAGEMENT_TOKEN or '', body)
+            response = requests.post(url, data=body.encode(), headers={
+                'Content-Type': 'application/json', 'SC-Signature': signature
+            })
+            print(f"Delivery {number}: {response.status_code} {response.text}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_parser = commands.add_parser('serve', help="receive webhooks")
+    serve_parser.add_argument('--host', default=WEBHOOK_HOST)
+    serve_parser.add_argument('--port', type=int, default=WEBHOOK_PORT)
+    serve_parser.add_argument('--record', help="append every verified delivery to this JSONL file")
+    replay_parser = commands.add_parser('replay', help="post recorded deliveries to a receiver")
+    replay_parser.add_argument('path')
+    replay_parser.add_argument('--url', default=f"http://{WEBHOOK_HOST}:{WEBHOOK_PORT}/")
+    args = parser.parse_args()
+    configure_logging()
+    if args.command == 'serve':
+        serve(args.host, args.port, args.record)
+    else:
+        replay(args.path, args.url)